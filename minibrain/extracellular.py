@@ -28,8 +28,9 @@ def fourier_spectrum(data, srate, fmax = None):
     Arguments:
     ----------
     data (array)
-        A numpy array in microvolts
-    
+        A numpy array in microvolts. For a 2D array the spectra
+        are computed along the last axis.
+
     srate (int)
         the sampling rate in samples per second
     
@@ -41,11 +42,12 @@ def fourier_spectrum(data, srate, fmax = None):
     until the Nyquist frequency. 
         
     """
-    fcoeff = np.fft.fft(data)/data.size
-    DC = [np.abs(fcoeff[0])] # DC component
-    amp = np.concatenate( (DC, 2*np.abs(fcoeff[1:])) )
-    
-    Nsamples = int( np.floor(data.size/2) )
+    data = np.asarray(data)
+    fcoeff = np.fft.fft(data, axis = -1)/data.shape[-1]
+    amp = 2*np.abs(fcoeff)
+    amp[..., 0] *= 0.5 # the DC component is not mirrored
+
+    Nsamples = int( np.floor(data.shape[-1]/2) )
     Nyquist = srate/2.
     hz = np.linspace(0, Nyquist, Nsamples + 1)
     dhz = hz[1] # 
@@ -59,7 +61,7 @@ def fourier_spectrum(data, srate, fmax = None):
         hz = hz[:int(fmax/dhz)]
     
     # amplitudes until Nyquist frequency
-    return (hz, amp[:len(hz)])
+    return (hz, amp[..., :len(hz)])
 
 def low_pass(data, cutoff):
     """
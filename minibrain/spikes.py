@@ -13,60 +13,90 @@ Example:
 >>> from minibrain  import Units 
 """
 
-import copy 
-
-import pathlib 
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
-@np.vectorize
+from minibrain.loader import njit, _HAS_NUMBA
+
+@njit(cache = True)
+def _bucket_sort(times, clusters, offsets, out):
+    """
+    Counting-sort pass that writes every spike time into the bucket
+    of its cluster, given the bucket offsets from bincount + cumsum.
+    Times keep their original (chronological) order inside a bucket.
+
+    Arguments
+    ---------
+    times (array)
+        spike times, chronologically sorted
+
+    clusters (array)
+        the cluster id of every spike
+
+    offsets (array)
+        bucket bounds per cluster id, of size nclusters + 1
+
+    out (array)
+        preallocated output of the same size as times
+    """
+    pos = offsets[:-1].copy()
+    for i in range(times.shape[0]):
+        c = clusters[i]
+        out[ pos[c] ] = times[i]
+        pos[c] += 1
+
+# upper channel bounds and shank letters for every probe type; the
+# 'P' from Cambridge Neurotech has the same electrode organization
+# as the 'E', but different geometry.
+_SHANK_BINS = {
+    'P':  np.array([16, 32, 48, 64, 80, 96, 112, 128]),
+    'F':  np.array([10, 21, 32, 43, 54, 64]),
+    'FF': np.array([10, 21, 32, 43, 54, 64,
+                    74, 85, 96, 107, 118, 128]),
+}
+_SHANK_BINS['E'] = _SHANK_BINS['P']
+_SHANK_BINS['PP'] = _SHANK_BINS['EE'] = _SHANK_BINS['P']
+
+_SHANK_LETTERS = {
+    'P':  np.array(list('ABCDEFGH')),
+    'F':  np.array(list('ABCDEF')),
+    'FF': np.array(list('ABCDEFGHIJKL')),
+}
+_SHANK_LETTERS['E'] = _SHANK_LETTERS['P']
+_SHANK_LETTERS['PP'] = _SHANK_LETTERS['EE'] = _SHANK_LETTERS['P']
+
 def read_shank(channel, shanktype='P'):
     """
     Returns the shankID of the channel.
 
     Parameters
     ----------
-    channel (int)
-        The number of the channel in the shank
+    channel (int or array)
+        The number of the channel in the shank. Arrays of channels
+        are mapped in a single vectorized call.
 
     shanktype (str):
-        the type of probe used: 
+        the type of probe used:
         the 'P' from Cambridge Neurotech has the same electrode organization
         as the 'E', but different geometry.
     """
-    if shanktype == 'P' or shanktype == 'E':
-        rules = [range( 0,16), range(16,32), range(32,48), range(48,64),
-                range(64,80), range(80,96), range(96,112), range(112,128)]
-        shank = 'ABCDEFGH'
-
-    elif shanktype == 'F':
-        rules = [range( 0,10), range(10,21), range(21,32), range(32,43),
-                range(43,54), range(54,64)]
-        shank = 'ABCDEF'
-
-    elif shanktype == 'FF':
-        rules = [range( 0,10), range(10,21), range(21,32), range(32,43),
-                range(43,54), range(54,64), 
-                range(64,74), range(74,85), range(85,96), range(96,107),
-                range(107,118), range(118, 128)]
-        shank = 'ABCDEFGHIJKL'
-
-    elif shanktype == 'PP' or shanktype == 'EE':
-        rules = [range( 0,16), range(16,32), range(32,48), range(48,64),
-                range(64,80), range(80,96), range(96,112), range(112,128)]
-        shank = 'ABCDEFGH'
-
-    else: # this is like PP or EE
-        rules = [range( 0,16), range(16,32), range(32,48), range(48,64),
-                range(64,80), range(80,96), range(96,112), range(112,128)]
-        shank = 'ABCDEFGH'
-
-
-    for i,sh in enumerate(rules):
-        if channel in sh:
-            return shank[i]
+    if shanktype in ('P', 'E', 'PP', 'EE'):
+        # shanks of exactly 16 channels: a shift replaces the search
+        mychannel = np.asarray(channel, dtype = np.int32)
+        myshank = _SHANK_LETTERS['P'][ (mychannel >> 4) & 7 ]
+    else:
+        # unknown probe types fall back to 'P', like before
+        mybins = _SHANK_BINS.get(shanktype, _SHANK_BINS['P'])
+        myletters = _SHANK_LETTERS.get(shanktype, _SHANK_LETTERS['P'])
+
+        # one C-level binary search instead of scanning range objects
+        myshank = myletters[ np.digitize(channel, mybins) ]
+    if myshank.ndim == 0:
+        return str(myshank)
+    return myshank
 
 class Units(object):
     """
@@ -91,38 +121,100 @@ class Units(object):
     
         #myfile = path + 'cluster_info.tsv'
         myfile = pathlib.PurePath(path, 'cluster_info.tsv')
-        df = pd.read_csv(myfile, sep = '\t')
-        
+
+        # read only the columns we keep, with explicit dtypes, so
+        # pandas skips type sniffing and the unused Kilosort2 terms
+        # ('sh', 'Amplitude', 'amp', 'KSLabel', 'depth', ...)
+        mycols = {'cluster_id', 'id', 'ch', 'fr', 'group',
+                  'n_spikes', 'ISI.median'}
+        mydtypes = {'cluster_id': np.int32, 'id': np.int32,
+                    'ch': np.int16, 'fr': np.float32,
+                    'n_spikes': np.int32}
+        df = pd.read_csv(myfile, sep = '\t', engine = 'c',
+            usecols = lambda column: column in mycols, dtype = mydtypes)
+
         # make a copy with only good units
         df_unit = df[ (df['group']=='good') ].copy()
-
-        # remove some unused terms from Kilosort2
-        remove = ['sh', 'group', 'Amplitude', 'amp', 'KSLabel', 'depth']
-        df_unit.drop(remove, axis=1, inplace = True)
+        df_unit.drop('group', axis=1, inplace = True)
 
         # old phy-devel uses simply 'id'
         if 'id' in df_unit.columns:
             df_unit.rename(columns = {'id':'cluster_id'}, inplace=True)
 
-        # map shank according to channel number 
-        df_unit['shank'] = df_unit['ch'].apply(lambda x: read_shank(x, shanktype))
+        # map shank according to channel number, one vectorized call;
+        # categorical storage makes downstream groupbys cheaper
+        df_unit['shank'] = pd.Categorical(
+            read_shank(df_unit['ch'].to_numpy(), shanktype) )
 
         # use human-readable columns
         df_unit.rename(columns = {'ch':'channel'}, inplace=True)
         df_unit.rename(columns = {'fr':'frequency'}, inplace=True)
 
-        # read good units
+        # read good units; memory-mapped, so the files are paged in
+        # on demand instead of copied whole into RAM (the grouping
+        # below only keeps the spikes of good clusters)
         if isinstance(path,str):
-            spike_times = np.load(path + 'spike_times.npy').flatten()
-            spike_clusters = np.load(path + 'spike_clusters.npy')
+            spike_times = np.load(path + 'spike_times.npy',
+                mmap_mode = 'r').reshape(-1)
+            spike_clusters = np.load(path + 'spike_clusters.npy',
+                mmap_mode = 'r')
+        else:
+            spike_times = np.load(pathlib.PurePath(path,'spike_times.npy'),
+                mmap_mode = 'r').reshape(-1)
+            spike_clusters = np.load(pathlib.PurePath(path,'spike_clusters.npy'),
+                mmap_mode = 'r')
+
+        # sample indices fit in int32 (2^31 samples is ~20 hours at
+        # 30 kHz); halving the width doubles the spikes per cache line
+        assert spike_times.max(initial = 0) < 2**31
+        spike_times = spike_times.astype(np.int32, copy = False)
+        spike_clusters = spike_clusters.astype(np.int32, copy = False)
+
+        # read spikes from units: group all clusters in one pass
+        # instead of scanning spike_clusters once per good unit
+        good_ids = df_unit['cluster_id'].values
+        mymask = np.isin(spike_clusters, good_ids)
+        myclusters = spike_clusters[mymask]
+        mytimes = spike_times[mymask]
+
+        # bucket offsets: Kilosort2 assigns small non-negative cluster
+        # ids, so bincount + cumsum gives the slice bounds of every
+        # cluster directly, without np.unique
+        nclu = int(good_ids.max()) + 1 if good_ids.size else 1
+        counts = np.bincount(myclusters, minlength = nclu)
+        offsets = np.zeros(nclu + 1, dtype = np.int64)
+        offsets[1:] = np.cumsum(counts)
+
+        if _HAS_NUMBA: # compiled counting sort, one linear pass
+            out = np.empty_like(mytimes)
+            _bucket_sort(mytimes, myclusters, offsets, out)
+            mytimes = out
         else:
-            spike_times = np.load(pathlib.PurePath(path,'spike_times.npy')).flatten()
-            spike_clusters = np.load(pathlib.PurePath(path,'spike_clusters.npy'))
-        
-        # read spikes from units
+            # stable sort keeps the spike times of every unit sorted
+            # (radix sort for integer keys, so effectively linear)
+            order = np.argsort(myclusters, kind = 'stable')
+            mytimes = mytimes[order]
+
+        # CSR-style storage: one contiguous value array plus per-id
+        # offsets, for bulk operations over all units at once
+        self._spike_values = mytimes
+        self._spike_offsets = offsets
+
         dict_unit = dict() # a dictionary with all units
-        for myid in df_unit['cluster_id'].values:
-            dict_unit[myid] = spike_times[np.where(spike_clusters==myid)]
+        for myid in good_ids: # units without spikes get an empty array
+            # every entry is a view into self._spike_values
+            myunit = mytimes[ offsets[myid]:offsets[myid+1] ]
+            if myunit.size:
+                # some datasets carry unsorted times or negative
+                # sentinels; the pulse queries rely on sorted order
+                if not ( myunit[1:] >= myunit[:-1] ).all():
+                    myunit.sort()
+                if myunit[0] < 0: # still a view after the sort
+                    myunit = myunit[ np.searchsorted(myunit, 0): ]
+            myunit.setflags(write = False)
+            # native int keys hash faster than numpy scalars and
+            # guarantee O(1) lookups from any integer type
+            dict_unit[ int(myid) ] = myunit
 
         # reorder by channel and set index to cluster_id 
         df_unit.sort_values(by='channel', inplace=True)
@@ -163,52 +255,44 @@ class Units(object):
         """
         myunit = self.unit[cluster_id]
 
-        myspikes = list() # collects spike times for every pulse
-
-        latency = list()  # latency from the beginning of pulse
-        count = list()  # number of spikes during the pulse
-        duration = list() # number of samples between 1st and last spike
-        isi = list() # average inter-spike interval (in samples)
-        n_zeros, n_ones, n_more = (0, 0, 0)
-        for p in pulse:
-            start, end = p
-            idx = np.logical_and( myunit>start, myunit< end )
-            spk_times = list(myunit[idx] - start) # remove beginning of pulse
-
-            # get latency, count, duration and isi
-            if spk_times: # not empty spikes
-                latency.append(spk_times[0])
-                count.append( len(spk_times) )
-            else:
-                n_zeros +=1
-                latency.append( np.nan )
-                count.append( np.nan  )
-
-
-            if len(spk_times) == 1: # one spike gives nan
-                n_ones +=1
-                duration.append(0)
-                isi.append( np.nan )
-            elif len(spk_times) >1: # more than 1 spike
-                n_more +=1
-                duration.append(  np.max(spk_times) - np.min(spk_times) )
-                isi.append( np.diff(spk_times).mean() )
-            
-            myspikes.append( spk_times ) # remove beginning of pulse
+        # accept lists of tuples or arrays, coerced once
+        mypulse = np.ascontiguousarray(pulse, dtype = np.int64)
+        mypulse = mypulse.reshape(-1, 2)
+        starts, ends = mypulse[:, 0], mypulse[:, 1]
+
+        # spike times from Kilosort2 are monotonically sorted, so a
+        # binary search per pulse replaces the boolean mask over the
+        # whole unit. Both bounds are exclusive, like the masks before.
+        lo = np.searchsorted(myunit, starts, side = 'right')
+        hi = np.searchsorted(myunit, ends, side = 'left')
+        counts = hi - lo # spikes per pulse
+
+        fired = counts > 0 # pulses with at least one spike
+        burst = counts > 1 # pulses with more than one spike
+
+        # first/last spike of the responding pulses, relative to the
+        # beginning of their pulse
+        firsts = myunit[ lo[fired] ] - starts[fired]
+        lasts = myunit[ hi[fired] - 1 ] - starts[fired]
+
+        # mean inter-spike interval is (last-first)/(nspikes-1)
+        spread = myunit[ hi[burst] - 1 ] - myunit[ lo[burst] ]
 
         mydict = dict()
-        # use masked arrays to avoid missing values
-        # will return RuntimeWarning if arrays contain only np.nan 
-        mydict['latency'] = np.nanmean( latency ) 
-        mydict['count'] = np.nanmean( count   )
-        mydict['duration'] = np.nanmean( duration)
-        mydict['isi'] = np.nanmean( isi     )
-        mydict['prop_zeros'] = n_zeros/len(pulse)
-        mydict['prop_ones'] = n_ones/len(pulse)
-        mydict['prop_more'] = n_more/len(pulse)
+        # means over the responding pulses; like np.nanmean before,
+        # pulses without spikes give np.nan
+        mydict['latency'] = firsts.mean() if fired.any() else np.nan
+        mydict['count'] = counts[fired].mean() if fired.any() else np.nan
+        mydict['duration'] = (lasts - firsts).mean() if fired.any() \
+            else np.nan
+        mydict['isi'] = ( spread/(counts[burst]-1) ).mean() \
+            if burst.any() else np.nan
+        mydict['prop_zeros'] = int( (counts == 0).sum() )/len(mypulse)
+        mydict['prop_ones'] = int( (counts == 1).sum() )/len(mypulse)
+        mydict['prop_more'] = int( (counts > 1).sum() )/len(mypulse)
         # flatten all spikes in 1D array
-        mydict['spk_times'] = list(np.array([elem for trace in myspikes for elem in trace]))
-        #mydict['raw'] = myspikes
+        myspikes = np.concatenate( [myunit[l:h] for l, h in zip(lo, hi)] )
+        mydict['spk_times'] = list( myspikes - np.repeat(starts, counts) )
         return mydict
 
     def pulsecopy(self, pulse):
@@ -224,26 +308,42 @@ class Units(object):
         myclass = self.__class__
         myunit = myclass.__new__(myclass)
 
-        # make deep copies
-        mydict = copy.deepcopy( self.unit )
-        mydf = copy.deepcopy(self.df)
-        
-        for key, values in mydict.items():
-            mytimes = list()
-            for p in pulse:
-                start, end = p
-                spk_times = np.array(values)
-                select = np.logical_and(spk_times>start, spk_times<end)
-                if not spk_times[select].size == 0:
-                    newval = spk_times[select].tolist()
-                    mytimes.extend( newval )
-            mydict[key] = np.array(mytimes)
-            
-            index = mydf.index[ mydf['cluster_id']==key]
-            mydf.loc[index, 'n_spikes'] = int(len(mytimes))
-
-        # set attributes of new object 
-        setattr(myunit, 'unit', copy.deepcopy(mydict))
+        # the spike arrays are rebuilt from scratch below, so only the
+        # (small) dataframe needs its own copy
+        mydf = self.df.copy()
+        mydict = dict()
+
+        # accept lists of tuples or arrays, coerced once
+        mypulse = np.ascontiguousarray(pulse, dtype = np.int64)
+        mypulse = mypulse.reshape(-1, 2)
+        starts, ends = mypulse[:, 0], mypulse[:, 1]
+
+        def select(item):
+            key, values = item
+            spk_times = np.asarray(values)
+            # sorted spike times: binary search instead of boolean masks
+            lo = np.searchsorted(spk_times, starts, side = 'right')
+            hi = np.searchsorted(spk_times, ends, side = 'left')
+            # concatenate the slices directly, keeping the dtype and
+            # avoiding boxed Python ints
+            mysegments = [spk_times[l:h] for l, h in zip(lo, hi) if h > l]
+            if mysegments:
+                return key, np.concatenate(mysegments)
+            return key, np.empty(0, dtype = spk_times.dtype)
+
+        # units are independent and searchsorted/copy release the
+        # GIL, so they are queried in parallel threads
+        with ThreadPoolExecutor() as executor:
+            for key, mytimes in executor.map(select, self.unit.items()):
+                mydict[key] = mytimes
+
+        # one vectorized write instead of a label lookup per unit;
+        # cluster_id is the index of the dataframe
+        myspikes = {key: mytimes.size for key, mytimes in mydict.items()}
+        mydf['n_spikes'] = mydf.index.map(myspikes).astype(np.int32)
+
+        # set attributes of new object
+        setattr(myunit, 'unit', mydict)
         setattr(myunit, 'df', mydf)
 
         return myunit
@@ -18,6 +18,8 @@ to be tested with different machine learning methods.
 """
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
 from sklearn.base import BaseEstimator, TransformerMixin
@@ -89,9 +91,14 @@ class PandasReader(BaseEstimator, TransformerMixin):
 
         flist = self.path.glob( self.extension )
 
-        frames = [pd.read_pickle(df) for df in flist]
+        # unpickling numpy-backed frames releases the GIL, so the
+        # files are read in parallel threads
+        with ThreadPoolExecutor() as executor:
+            frames = list( executor.map(pd.read_pickle, flist) )
         self._nfiles = len(frames)
-        df = pd.concat(frames, sort=False, ignore_index=True)
+        # copy=False lets concat reuse the input blocks
+        df = pd.concat(frames, sort=False, ignore_index=True,
+                copy=False)
         df.set_index('uid', inplace=True)
 
         self._nrecords = df.shape[0]
@@ -106,6 +113,64 @@ class PandasReader(BaseEstimator, TransformerMixin):
 
     nrecords = property(lambda self: self._nrecords)
 
+def _read_units(task):
+    """
+    Reads all good units of one recording and extracts all kinetic
+    parameters and the waveform in every normalized spike. Runs in
+    a worker process, so it lives at module level to be picklable.
+
+    Arguments
+    ---------
+    task (dict)
+        'prefix' is the recording prefix (e.g. VT001) of a single
+    experiment, 'organoid' the organoid type (e.g., DLX_Cheriff),
+    'spk_path' the path to the Phy2 output for Units, and 'params'
+    the keyword parameters for the EphysLoader object.
+
+    Returns
+    -------
+    A dictionary of columns with all spike waveform kinetics
+    together with an unique identifier (uid) corresponding
+    to the expID + cluster_id.
+    """
+    prefix = task['prefix']
+    organoid = task['organoid']
+
+    # first load Units and Ephysloader objects
+    myrec = EphysLoader(**task['params'])
+    myunits = Units(task['spk_path']) # return good spike clusters
+    df = myunits.df
+
+    # to obtain kinetic properties from all units we accumulate
+    # columns (pandas builds frames from columns in one pass, while
+    # lists of row dicts force row-wise dtype inference); units
+    # sitting on the same channel share a single read of the binary
+    myisi = df['ISI.median'] # hoisted, itertuples mangles dots
+    mycolumns = dict()
+    for mychannel, mygroup in df.groupby('channel', sort=False):
+        uvolt = myrec.channel(mychannel)
+        uvolt -= np.median(uvolt) # correct for median
+        for row in mygroup.itertuples(): # index are cluster_ids
+            idx = row.Index
+            myspk = myunits.unit[idx]
+            spike_kinetics = myrec.waveform_kinetics(
+                    spk_times = myspk,
+                    channel = mychannel, uvolt = uvolt)
+            spike_kinetics['uid'] = prefix + f'_{idx:03d}' \
+                    + row.shank
+            # add relevant data from KiloSort2 clustering
+            spike_kinetics['frequency'] = row.frequency
+            spike_kinetics['n_spikes'] = row.n_spikes
+            spike_kinetics['ISI.median'] = myisi.at[idx]
+            # add relevant recording properties
+            spike_kinetics['age'] = myrec.age/30 # in months
+            spike_kinetics['organoid'] = organoid # from csv
+            for key, value in spike_kinetics.items():
+                mycolumns.setdefault(key, []).append( value )
+
+    return mycolumns
+
+
 class WaveformExtractor(BaseEstimator, TransformerMixin):
     """
     Reads a csv file to create the paths for the binaries 
@@ -139,68 +204,6 @@ class WaveformExtractor(BaseEstimator, TransformerMixin):
         """
         self.split_waveforms = split_waveforms
 
-    def __get_units(self,prefix,organoid,spk_path,**loader_params):
-        """
-        Reads units from path, and extract all kinetic parameters
-        and the waveform in every normalized spike.
-
-        Arguments
-        ---------
-        prefix (str)
-            This is the recording prefix (e.g. VT001) that 
-        corresponding to a single experiment.
-
-        organoid (str)
-            The organoid type used (e.g., DLX_Cheriff for 
-        ventralized organoids containing blue Channelrhodopsin)
-
-        spk_path (str)
-            It is the path to cluster_info.csv generated by
-        KiloSort2. It is need for Units objects to read the
-        spike clusters.
-
-        **loader_params (kwargs)
-            A dictionary with the parameters to pass to the
-        EphysLoader object.
-
-        Returns
-        -------
-        A list of dictionaries with all spike waveform kinetics
-        together with an unique identifier (uid) corresponding
-        to the expID + cluster_id.
-        
-        """
-        # first load Units and Ephysloader objects
-        myrec = EphysLoader(**loader_params)
-        myunits = Units(spk_path) # return good spike clusters
-        df = myunits.df
-
-        # to obtain kinetic properties from all units
-        # we create a list of dictionaries
-        dict_list = list()
-        for idx in df.index: # idx are cluster_ids
-            myspk = myunits.unit[idx]
-            spike_kinetics = myrec.waveform_kinetics(
-                    spk_times = myspk, 
-                    channel = df.loc[idx].channel)
-            sh = df.loc[idx].shank
-            spike_kinetics['uid'] = prefix + f'_{idx:03d}' + sh
-            # add relevant data from KiloSort2 clustering
-            spike_kinetics['frequency'] = df.loc[idx].frequency
-            spike_kinetics['n_spikes'] = df.loc[idx].n_spikes
-            spike_kinetics['ISI.median'] = df.loc[idx,'ISI.median']
-            # add relevant recording properties
-            spike_kinetics['age'] = myrec.age/30 # in months
-            spike_kinetics['organoid'] = organoid # from csv file
-            dict_list.append( spike_kinetics )
-
-
-        # create unique identifiers (uid)
-        df.reset_index(inplace=True) # cluster_id is not index
-        df['uid']=df.cluster_id.apply(lambda x: prefix+f'_{x:03d}')
-
-        return dict_list 
-        
     def fit(self, X, y = None, **fit_params):
         """
         Returns the transformer object, nothing to do here
@@ -236,44 +239,57 @@ class WaveformExtractor(BaseEstimator, TransformerMixin):
         # set index to 'expID'
         # transform recording and experiment number to strings
         df.set_index('expID', inplace = True)
-        df.recording = pd.to_numeric(df.recording, 
-                downcast = 'integer').astype(str)
-        df.experiment = pd.to_numeric(df.experiment, 
-                downcast = 'integer').astype(str) 
-        df.nchan = pd.to_numeric(df.nchan, downcast='integer') 
-        
+        # the values end up in path strings, so the integer downcast
+        # pass was wasted work
+        df.recording = pd.to_numeric(df.recording).astype(
+                'int64').astype(str)
+        df.experiment = pd.to_numeric(df.experiment).astype(
+                'int64').astype(str)
+        df.nchan = pd.to_numeric(df.nchan, downcast='integer')
+
+        # recording date and birth come from string surgery on the
+        # binarypath and EB columns; done once, vectorized, instead
+        # of splitting and replacing per row inside the loop
+        parts = df['binarypath'].str.split('_', expand = True)
+        df['date'] = (parts[1] + '_' + parts[2]).str.replace(
+                '/', '-', regex = False)
+        df['birth'] = df['EB'].str.replace('/', '-', regex = False)
+
         # read every line of the csv file to get units
         myhome = os.environ['HOME']
-        units_list = list() # a list of dictionaries
-        for idx in df.index:
-            binary = os.path.join(myhome, df.loc[idx].binarypath)
-            experiment = 'experiment' + df.loc[idx].experiment
-            recording = 'recording' + df.loc[idx].recording  
-            channelmap = 'Channel_Map-' + df.loc[idx].Channel_Map
+        tasks = list() # one task per recording
+        for row in df.itertuples(): # the index are expIDs
+            idx = row.Index
+            binary = os.path.join(myhome, row.binarypath)
+            experiment = 'experiment' + row.experiment
+            recording = 'recording' + row.recording
+            channelmap = 'Channel_Map-' + row.Channel_Map
             # dictionary of parameter for EphysLoader
             params = dict()
-            rec_path = os.path.join(binary, experiment, 
+            rec_path = os.path.join(binary, experiment,
                     recording,'continuous', channelmap)
             params['fname']=os.path.join(rec_path,'continuous.dat')
-            day = df.loc[idx].binarypath.split('_')[1]
-            time = df.loc[idx].binarypath.split('_')[2]
-            mydate = day + '_' + time
-            params['date'] = mydate.replace('/', '-')
-            params['birth'] = df.loc[idx, 'EB'].replace('/','-')
-            params['nchan'] = df.loc[idx].nchan
-
+            params['date'] = row.date
+            params['birth'] = row.birth
+            params['nchan'] = row.nchan
 
             # prepare to read all units from that file
-            organoid = df.loc[idx].organoid
-            spk_path = os.path.join(rec_path, 'sorting/')
-            # will return a list of units
-            mylist =self.__get_units(prefix=idx,organoid=organoid, 
-                    spk_path = spk_path, **params)
-            units_list.extend( mylist )
-            #units.extend( df )
-
-        mydf = pd.DataFrame(units_list)
-        # set unique identifier based on cluster_id
+            tasks.append( dict(prefix = idx,
+                    organoid = row.organoid,
+                    spk_path = os.path.join(rec_path, 'sorting/'),
+                    params = params) )
+
+        # recordings are independent and the kinetics extraction is
+        # CPU-bound, so every recording goes to a worker process
+        mycolumns = dict() # a dictionary of columns
+        with ProcessPoolExecutor() as executor:
+            for result in executor.map(_read_units, tasks):
+                for key, values in result.items():
+                    mycolumns.setdefault(key, []).extend( values )
+
+        # column-wise construction, one dtype inference per column;
+        # the unique identifier is based on cluster_id
+        mydf = pd.DataFrame(mycolumns)
         mydf.set_index('uid', inplace=True)
 
         if self.split_waveforms:
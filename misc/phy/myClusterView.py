@@ -17,6 +17,50 @@ from phy import IPlugin, connect
 from phy import emit
 from phy.cluster import Clustering
 
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+if _HAS_NUMBA:
+    @njit(parallel = True, fastmath = True, cache = True)
+    def median_isi_per_cluster(times, offsets):
+        """
+        Computes the median inter-spike interval of every cluster
+        in one pass over the flat buffer of spike times. Clusters
+        are reduced in parallel, so a view refresh pays one call
+        instead of K Python round-trips.
+
+        Arguments
+        ---------
+        times: flat float64 array with the spike times of all the
+            clusters, sorted within each cluster
+        offsets: int64 array of size K+1 where cluster k occupies
+            times[offsets[k]:offsets[k+1]]
+
+        Returns
+        -------
+        A float64 array with one median ISI per cluster (0 for
+        clusters with less than 3 spikes).
+        """
+        K = offsets.size - 1
+        out = np.zeros(K)
+        for k in prange(K):
+            a, b = offsets[k], offsets[k + 1]
+            n = b - a - 1
+            if n < 2:
+                continue
+            buf = np.empty(n)
+            for i in range(n):
+                buf[i] = times[a + i + 1] - times[a + i]
+            buf.sort()
+            if n & 1:
+                out[k] = buf[n//2]
+            else:
+                out[k] = 0.5*( buf[n//2 - 1] + buf[n//2] )
+        return out
+
 
 class Test(IPlugin):
     def attach_to_controller(self, controller):
@@ -58,7 +102,20 @@ class ISImedian(IPlugin):
             of the cluster_id
             """
             t = controller.get_spike_times(cluster_id).data
-            return np.median(np.diff(t)) if len(t)>2 else 0
+            if len(t) < 3:
+                return 0
+            if _HAS_NUMBA:
+                myt = np.ascontiguousarray(t, dtype = np.float64)
+                offsets = np.array([0, myt.size], dtype = np.int64)
+                return float( median_isi_per_cluster(myt, offsets)[0] )
+            # np.partition selects the median in O(n) instead of
+            # the full sort np.median may fall back to
+            isi = np.subtract(t[1:], t[:-1])
+            k = isi.size // 2
+            if isi.size & 1:
+                return float( np.partition(isi, k)[k] )
+            mypart = np.partition(isi, [k - 1, k])
+            return 0.5*( mypart[k - 1] + mypart[k] )
 
         def cc_index(cluster_id):
             """
@@ -116,7 +173,12 @@ class SpikeSplitter(IPlugin):
                 # get the sample of the first spike
                 t = controller.get_spike_times( sel[0] )
                 p = controller.get_spike_ids( sel[0] )
-                x = np.argmax( t>time ) 
+                # spike times are sorted: binary search instead of
+                # scanning the whole array on every click
+                myt = getattr(t, 'data', t)
+                x = np.searchsorted(myt, time, side = 'right')
+                if x == len(myt): # clicked past the last spike
+                    x = len(myt) - 1
                 print(x)
                 # remove this p[x]
                 controller.supervisor.actions.split(list(p[x]))
@@ -16,11 +16,13 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg') # headless app, skip the GUI backend probe
 import matplotlib.pyplot as plt
 from matplotlib import style
 style.use('https://raw.githubusercontent.com/JoseGuzman/minibrain/master/minibrain/paper.mplstyle') 
 
-from sklearn.decomposition import PCA
+from sklearn.decomposition import IncrementalPCA
 from minibrain.utils import mycolors
 
 # Define main body
@@ -40,22 +42,64 @@ k = st.sidebar.slider('Number of spike clusters',2,10,3)  #
 st.sidebar.write(k, 'squared is', k * k)
 
 # Dimensionality reduction by PCA
-@st.cache
-def pca_reduction(n_components):
+def read_samples(chunksize = 4096):
     """
+    Returns an iterator of float32 chunks with the waveform samples
+    past the 30-sample (1 ms) baseline. A header peek builds the
+    usecols list, so the organoid column and the baseline are never
+    tokenized.
     """
     mypath = './DataSets/waveforms.csv'
-    waveforms = pd.read_csv(mypath, index_col = 'uid')
-    df = waveforms.drop(['organoid'], axis = 1)
-    trace = df.values[:, 30:] # remove first 30 samples (1 ms) of waveform baseline
-    
-    mypca = PCA(n_components)
-    PC = mypca.fit_transform(trace)
+    header = pd.read_csv(mypath, nrows = 0)
+    mysamples = [col for col in header.columns
+        if col not in ('uid', 'organoid')]
+    return pd.read_csv(mypath, index_col = 'uid',
+        usecols = ['uid'] + mysamples[30:],
+        dtype = dict.fromkeys(mysamples[30:], np.float32),
+        engine = 'c', chunksize = chunksize)
+
+@st.cache_resource
+def fit_pca(n_components):
+    """
+    Fits IncrementalPCA over the waveform csv in chunks, bounding
+    memory by the batch size instead of the dataset. The fitted
+    model is cached as a resource, so anything that projects again
+    (new points, reruns) costs a single matrix multiply.
+    """
+    mypca = IncrementalPCA(n_components, batch_size = 4096)
+    for chunk in read_samples():
+        mypca.partial_fit(chunk.values)
+
+    return mypca
+
+@st.cache_data(persist = 'disk')
+def pca_reduction(n_components):
+    """
+    Returns a DataFrame with the principal components of every
+    waveform and the explained variance (in %). The projection is
+    persisted next to the csv file, so cold starts skip both the
+    parse and the fit.
+    """
+    mypcs = Path('./DataSets/waveforms_pcs.parquet')
+    myvar = Path('./DataSets/waveforms_var.npy')
+    if mypcs.exists() and myvar.exists():
+        return ( pd.read_parquet(mypcs), np.load(myvar) )
+
+    mypca = fit_pca(n_components)
     var = mypca.explained_variance_ratio_*100 # variance in percentage
-    
-    
-    waveforms['PC1'] = PC[:,0]
-    waveforms['PC2'] = PC[:,1]
+
+    # second streamed pass to project every chunk
+    mypc, myindex = list(), list()
+    for chunk in read_samples():
+        mypc.append( mypca.transform(chunk.values) )
+        myindex.append( chunk.index )
+    PC = np.concatenate(mypc)
+
+    waveforms = pd.DataFrame({'PC1': PC[:,0], 'PC2': PC[:,1]},
+        index = myindex[0].append(myindex[1:]) )
+
+    waveforms.to_parquet(mypcs)
+    np.save(myvar, var)
 
     return (waveforms, var)
 
@@ -64,7 +108,10 @@ waveforms, var = pca_reduction(n_components = 2 )
 # visualize
 fig, ax = plt.subplots(1,1, figsize=(4,3))
 
-ax.scatter(x = waveforms.PC1, y = waveforms.PC2, s=6, c='gray')
+# rasterized draws the cloud as pixels, so the render cost stops
+# growing with the number of spikes
+ax.scatter(x = waveforms.PC1.values, y = waveforms.PC2.values,
+    s=6, c='gray', rasterized=True, linewidths=0)
 ax.set_xlabel(f'PC$_1$ = {var[0]:2.1f} %')
 ax.set_ylabel(f'PC$_2$ = {var[1]:2.1f} %')
 ax.set_xlim(-3,3) 
@@ -73,8 +120,6 @@ ax.set_yticks([-2,0,2])
 ax.set_xticks([-2,0,2])
 
 left_col.pyplot(fig)
-left_col.pyplot(fig)
-right_col.pyplot(fig)
 right_col.pyplot(fig)
 #st.write(f'{waveforms.shape[0]} spikes')
 st.markdown('*Check out this [article](https://www.kaggle.com/joseguzman/spike-classification-based-on-waveforms) for a detailed walk-through!*')
\ No newline at end of file
@@ -18,8 +18,27 @@ Requirements:
 minibrain 
 """
 import logging
+import numpy as np
 import pandas as pd
 
+def write_csv(df, path):
+    """
+    Writes the DataFrame as csv through pyarrow, which formats the
+    cells in C instead of pandas' Python-level writer.
+
+    Arguments
+    ---------
+
+    df: a pandas DataFrame (the index is written as first column)
+    path: pathlib object with the csv file to write
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+
+    table = pa.Table.from_pandas(df.reset_index(),
+        preserve_index = False)
+    pacsv.write_csv(table, str(path))
+
 def write_readme(path, mystr):
     """
     updates Readme.md with new data
@@ -30,19 +49,16 @@ def write_readme(path, mystr):
     path: pathlib object (e.g. Path('minibrain')
     mystr: message to add the the beginning of the file
     """
-    lines = list()
-    with open(path, 'r') as fp:
-        for line in fp:
-            if line.startswith('The dataset'):
-                line = mystr
-            lines.append(line)
-
-    with open(path, 'r+') as fp:
-        fp.writelines(lines)
-        
+    # write_text replaces the whole file; the old open(path, 'r+')
+    # did not truncate, leaving stale text when the new content
+    # was shorter
+    lines = [mystr if line.startswith('The dataset') else line
+        for line in path.read_text().splitlines(keepends = True)]
+    path.write_text(''.join(lines))
+
 def write_line(path, line, mystr):
     """
-    writes Readme.md in line 
+    writes Readme.md in line
 
     Arguments
     ---------
@@ -51,17 +67,34 @@ def write_line(path, line, mystr):
     line: (int) the line to write
     mystr: message to add to Readme.md in the line
     """
-    # read file in a list (fp.readlines()
-    with open(path, 'r') as fp:
-        lines = fp.readlines()
+    lines = path.read_text().splitlines(keepends = True)
+    lines[line] = mystr
+    path.write_text(''.join(lines))
 
-    lines[line] = mystr 
-    with open(path, 'r+') as fp:
-        fp.writelines(lines)
+def load_waveforms(mypath):
+    """
+    Reads all *df files of one directory with its own PandasReader,
+    so the file counters stay race-free when directories are read
+    in parallel threads.
+
+    Arguments
+    ---------
+
+    mypath: pathlib object with the directory to read
+
+    Returns
+    -------
+    A tuple with the DataFrame, the number of files and the number
+    of recordings found in the directory.
+    """
+    from minibrain.transformers import PandasReader
+    myreader = PandasReader()
+    df = myreader.transform('*df', mypath)
+    return df, len(myreader), myreader.nrecords
 
 if __name__ == '__main__':
     from pathlib import Path
-    from minibrain.transformers import PandasReader
+    from concurrent.futures import ThreadPoolExecutor
 
     # Globals
     HOME = Path.home()
@@ -81,45 +114,59 @@ if __name__ == '__main__':
     pathlist = [VT, FS, FH, TC, AP]
 
 
-    dfreader = PandasReader(extension = '*df') # all *df files
+    # the directories are independent and unpickling releases the
+    # GIL, so all of them are read concurrently
+    with ThreadPoolExecutor(max_workers = len(pathlist)) as executor:
+        results = list( executor.map(load_waveforms, pathlist) )
 
     dfspikes_list = list()
-    dfwaveforms_list = list()
+    mywaves_list = list()
+    myindex_list = list()
     dforganoid_list = list()
     nsamples = 0 # counter
-    for mypath in pathlist:
-        dfspikes = dfreader.transform(path = mypath)
+    for mypath, (dfspikes, nfiles, nrecords) in zip(pathlist, results):
         print(f'{"#"*73}')
         print(f'{mypath}')
-        print(f'{dfreader.nrecords:3d} spikes')
-        print(f'{len(dfreader):3d} samples\n')
-        nsamples +=len(dfreader)
-        dfwaveforms = pd.DataFrame(dfspikes['waveform'].tolist(),
-                index = dfspikes.index)
-        dfwaveforms['organoid'] = dfspikes['organoid'] # copy organoid type
+        print(f'{nrecords:3d} spikes')
+        print(f'{nfiles:3d} samples\n')
+        nsamples += nfiles
+        # stack into one contiguous float32 block instead of letting
+        # pandas infer dtypes from a list of arrays
+        mywaves = np.stack( dfspikes['waveform'].to_numpy() )
+        mywaves_list.append( mywaves.astype(np.float32, copy = False) )
+        myindex_list.append( dfspikes.index )
 
         dfspikes.drop('waveform', axis = 1, inplace = True)
-        dforganoid = pd.DataFrame(dfspikes['organoid'].tolist(),
-                columns = ['organoid'], index = dfspikes.index)
+        # slicing keeps the column as one block instead of round-
+        # tripping every cell through a Python list
+        dforganoid = dfspikes[['organoid']]
 
         # both dfspikes and dfwaveforms maintain 'organoid' column
         dfspikes_list.append(dfspikes)
-        dfwaveforms_list.append(dfwaveforms)
         dforganoid_list.append(dforganoid)
 
-    # merge in GitHub all organoids together 
+    # merge in GitHub all organoids together
     # verify that we have unique index with ignore_index = False
     # sort=True is because AP organoids have location column
-    dfspikes = pd.concat(dfspikes_list, ignore_index = False, sort=True)
-    dfwaveforms = pd.concat(dfwaveforms_list, ignore_index = False)
-    dforganoid = pd.concat(dforganoid_list, ignore_index = False)
+    # copy = False reuses the per-directory blocks instead of
+    # duplicating them inside concat
+    dfspikes = pd.concat(dfspikes_list, ignore_index = False, sort=True,
+        copy = False)
+    dforganoid = pd.concat(dforganoid_list, ignore_index = False,
+        copy = False)
+    # the waveforms are homogeneous float32, so one np.concatenate
+    # builds the final block directly without the concat copy
+    myindex = myindex_list[0].append(myindex_list[1:])
+    dfwaveforms = pd.DataFrame(np.concatenate(mywaves_list, axis = 0),
+        index = myindex, copy = False)
+    dfwaveforms['organoid'] = dforganoid['organoid'] # copy organoid type
 
 
     # Create/update Datasets in git 
     #logging.info(f'Saving  {dfspikes.shape[0]:4d} spike waveforms in {git}')
-    dfspikes.to_csv(Path(GIT ,'spikes.csv'), index = True)
-    dfwaveforms.to_csv(Path(GIT, 'waveforms.csv'), index = True)
-    dforganoid.to_csv(Path(GIT, 'organoID.csv'), index = True)
+    write_csv(dfspikes, Path(GIT ,'spikes.csv'))
+    write_csv(dfwaveforms, Path(GIT, 'waveforms.csv'))
+    write_csv(dforganoid, Path(GIT, 'organoID.csv'))
     mytotal = f'The dataset contains a total of {dfspikes.shape[0]:3d} spikes in {nsamples} samples.\n'
 
     print(mytotal)
@@ -6,21 +6,9 @@ Created: Sun Jun 30 15:16:05 CEST 2019
 
 Installation file required for the minibrain module
 """
-import os
 import re
 import os.path as op
-from setuptools import setup 
-
-#-------------------------------------------------------------------------
-# setup
-#-------------------------------------------------------------------------
-def _package_tree(pkgroot):
-    path = op.dirname(__file__)
-    subdirs = [op.relpath(i[0], path).replace(op.sep, '.')
-               for i in os.walk(op.join(path, pkgroot))
-               if '__init__.py' in i[2]]
-    return subdirs
-
+from setuptools import setup, find_packages
 
 # read README.md
 curdir = op.dirname(op.realpath(__file__))
@@ -43,7 +31,7 @@ setup(
     author ='Jose Guzman',
     author_email = 'jguzman<at>guzman-lab.com',
     url = 'https://github.com/JoseGuzman/minibrain.git',
-    packages = ['minibrain'],
+    packages = find_packages(include = ['minibrain', 'minibrain.*']),
     python_requires='>=3.5',
     include_package_data = True,# include additional data
     package_data={
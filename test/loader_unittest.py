@@ -0,0 +1,132 @@
+"""
+loader_unittest.py
+
+Author: Jose Guzman, jose.guzman<at>guzman-lab.com
+Created: Thu Aug 28 10:12:44 CEST 2026
+
+Unit-testing for the binary loader of extracellular
+recordings (see minibrain.loader).
+"""
+
+import unittest
+import tempfile
+import os
+
+import numpy as np
+
+from scipy import signal
+
+from minibrain.loader import spike_windows, _peak_width
+from minibrain import EphysLoader
+
+
+class TestSpikeWindows(unittest.TestCase):
+    """
+    Unittest for the strided window extraction around spike times.
+    """
+
+    def setUp(self):
+        """
+        Create a test trace and some spike times
+        """
+        self.uvolt = np.arange(1000, dtype = float)
+        self.spk_times = np.array([100, 500, 900])
+
+    def test_window_values(self):
+        """
+        Test that windows match the simple slicing uvolt[p-phalf:p+phalf]
+        """
+        phalf = 75
+        mywin = spike_windows(self.uvolt, self.spk_times, phalf)
+        for i, p in enumerate(self.spk_times):
+            expected = self.uvolt[p-phalf:p+phalf]
+            self.assertTrue( np.array_equal(mywin[i], expected) )
+
+    def test_window_shape(self):
+        """
+        Test that every window has 2*phalf samples
+        """
+        phalf = 75
+        mywin = spike_windows(self.uvolt, self.spk_times, phalf)
+        self.assertEqual( mywin.shape, (3, 2*phalf) )
+
+    def test_border_spikes(self):
+        """
+        Test that spikes without a complete window are discarded
+        """
+        spk_times = np.array([10, 500, 995])
+        mywin = spike_windows(self.uvolt, spk_times, 75)
+        self.assertEqual( mywin.shape[0], 1 ) # only the middle one
+
+
+class TestPeakWidth(unittest.TestCase):
+    """
+    Unittest comparing _peak_width against scipy.signal.peak_widths
+    """
+
+    def test_matches_scipy(self):
+        """
+        Test widths and interpolated crossings on noisy spikes
+        """
+        rng = np.random.RandomState(42)
+        x = np.linspace(-3, 8, 150)
+        for trial in range(20):
+            mytrace = np.exp(-x**2) - 0.4*np.exp(-(x-2)**2/2)
+            mytrace += rng.normal(0, 0.02, x.size)
+            p_idx = int( mytrace.argmax() )
+            for rel in (0.1, 0.5, 0.9, 1.0):
+                width, left, right = _peak_width(mytrace, p_idx, rel)
+                expected = signal.peak_widths(mytrace,[p_idx],rel_height=rel)
+                self.assertAlmostEqual( width, expected[0][0] )
+                self.assertAlmostEqual( left,  expected[2][0] )
+                self.assertAlmostEqual( right, expected[3][0] )
+
+
+class TestEphysLoader(unittest.TestCase):
+    """
+    Unittest for EphysLoader with a small synthetic binary file.
+    """
+
+    def setUp(self):
+        """
+        Write a small (nsamples, nchan) int16 binary file
+        """
+        self.nchan = 4
+        self.nsamples = 3000
+        rng = np.random.RandomState(0)
+        self.data = rng.randint(-500, 500,
+            size = (self.nsamples, self.nchan)).astype('<i2')
+
+        fd, self.fname = tempfile.mkstemp(suffix = '.dat')
+        os.close(fd)
+        self.data.tofile(self.fname)
+
+        self.myrec = EphysLoader(fname = self.fname,
+            nchan = self.nchan, show_info = False)
+
+    def tearDown(self):
+        """
+        Remove the temporary binary file
+        """
+        del self.myrec
+        os.remove(self.fname)
+
+    def test_nsamples(self):
+        """
+        Test the number of samples read from the binary
+        """
+        self.assertEqual( len(self.myrec), self.nsamples )
+        self.assertEqual( self.myrec.nchannels, self.nchan )
+
+    def test_get_channel(self):
+        """
+        Test that get_channel returns the voltages in microvolts
+        """
+        for ch in range(self.nchan):
+            uvolt = self.myrec.get_channel(ch)
+            expected = self.data[:, ch]*EphysLoader.gain
+            self.assertTrue( np.allclose(uvolt, expected) )
+
+
+if __name__ == '__main__':
+    unittest.main()
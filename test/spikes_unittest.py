@@ -0,0 +1,122 @@
+"""
+spikes_unittest.py
+
+Author: Jose Guzman, jose.guzman<at>guzman-lab.com
+Created: Thu Aug 28 21:40:12 CEST 2026
+
+Unit-testing for the loading and windowing of sorted
+extracellular units (see minibrain.spikes).
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy as np
+import pandas as pd
+
+from minibrain import Units
+
+
+class TestUnits(unittest.TestCase):
+    """
+    Unittest for Units with a small synthetic Phy2 dataset.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Write cluster_info.tsv, spike_times.npy and spike_clusters.npy
+        for three good units and one noise cluster.
+        """
+        cls.path = tempfile.mkdtemp() + os.sep
+
+        myinfo = pd.DataFrame({
+            'cluster_id': [2, 3, 5, 7],
+            'Amplitude': [100., 80., 120., 90.],
+            'KSLabel': ['good', 'noise', 'good', 'good'],
+            'amp': [10., 8., 12., 9.],
+            'ch': [17, 1, 40, 120],
+            'depth': [200., 20., 420., 1250.],
+            'fr': [2.5, 0.1, 1.0, 0.5],
+            'group': ['good', 'noise', 'good', 'good'],
+            'n_spikes': [4, 1, 2, 1],
+            'sh': [0, 0, 0, 0],
+        })
+        myinfo.to_csv(cls.path + 'cluster_info.tsv', sep = '\t',
+            index = False)
+
+        # spike times sorted globally, as Kilosort2 writes them
+        times = np.array([ 50, 100, 110, 120, 200, 300, 1000, 5000])
+        clusters = np.array([ 3, 2, 2, 2, 5, 5, 7, 2])
+        np.save(cls.path + 'spike_times.npy', times)
+        np.save(cls.path + 'spike_clusters.npy', clusters)
+
+        cls.myunits = Units(path = cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Remove the temporary Phy2 directory
+        """
+        shutil.rmtree(cls.path)
+
+    def test_good_units(self):
+        """
+        Test that only good units are loaded
+        """
+        self.assertEqual( len(self.myunits), 3 )
+        self.assertEqual( set(self.myunits.unit), {2, 5, 7} )
+
+    def test_spike_times(self):
+        """
+        Test the spike times collected for every good unit
+        """
+        self.assertTrue( np.array_equal(self.myunits.unit[2],
+            [100, 110, 120, 5000]) )
+        self.assertTrue( np.array_equal(self.myunits.unit[5],
+            [200, 300]) )
+        self.assertTrue( np.array_equal(self.myunits.unit[7], [1000]) )
+
+    def test_shank(self):
+        """
+        Test the shank assigned from the channel number
+        """
+        myshank = self.myunits.df.loc[2, 'shank']
+        self.assertEqual( myshank, 'B' )
+
+    def test_get_spiketrain(self):
+        """
+        Test burst properties of a unit during a pulse
+        """
+        mydict = self.myunits.get_spiketrain(
+            pulse = [(90, 130), (400, 500)], cluster_id = 2)
+
+        self.assertAlmostEqual( mydict['latency'], 10 )
+        self.assertAlmostEqual( mydict['count'], 3 )
+        self.assertAlmostEqual( mydict['duration'], 20 )
+        self.assertAlmostEqual( mydict['isi'], 10 )
+        self.assertAlmostEqual( mydict['prop_zeros'], 0.5 )
+        self.assertAlmostEqual( mydict['prop_more'], 0.5 )
+        self.assertEqual( mydict['spk_times'], [10, 20, 30] )
+
+    def test_pulsecopy(self):
+        """
+        Test a copy of the units restricted to one pulse
+        """
+        mycopy = self.myunits.pulsecopy( pulse = [(90, 250)] )
+
+        self.assertTrue( np.array_equal(mycopy.unit[2],
+            [100, 110, 120]) )
+        self.assertTrue( np.array_equal(mycopy.unit[5], [200]) )
+        self.assertEqual( mycopy.unit[7].size, 0 )
+        self.assertEqual( mycopy.df.at[2, 'n_spikes'], 3 )
+
+        # the original object must remain untouched
+        self.assertEqual( self.myunits.unit[2].size, 4 )
+        self.assertEqual( self.myunits.df.at[2, 'n_spikes'], 4 )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,7 +23,8 @@ class TestWaveforKinetics(unittest.TestCase):
         """
         Load some random extracellular spikes
         """
-        waveforms = pd.read_csv('DataSets/waveforms.cvs', index_col = 'uid')
+        waveforms = pd.read_csv('DataSets/waveforms.csv',
+            index_col = 'uid', engine = 'pyarrow')
 
 
 if __name__ == '__main__':